@@ -1,100 +1,253 @@
-import pandas as pd
 import random as rd
-import os, pickle, pygame
+import os, pickle, pygame, hashlib, tempfile
 import pygame
-import queue, time
+import queue, time, sys, re
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
-from shapely.geometry import LineString, box
+from heapq import heappush, heappop
+from itertools import count
+from math import sqrt, isnan
 from datetime import datetime
 
+class Record:
+    # immutable row of csv table (weapon, armor, race...), Data keeps one shared instance per item and equipment slots point to it
+    # empty csv cells (NaN from pandas) are None
+    __slots__ = ("name",) # value of key column
+    table = None # attribute of Data with all records of this type
+    
+    def __init__ (self, name, row):
+        object.__setattr__(self, "name", name)
+        for field in self.__slots__:
+            value = row.get(field)
+            if isinstance(value, float) and isnan(value):
+                value = None
+            object.__setattr__(self, field, value)
+    
+    def __setattr__(self, name, value):
+        raise AttributeError (f"{type(self).__name__} {self.name} is read only")
+    
+    def __reduce__(self):
+        # pickled (saved characters, deepcopy, process pool) as reference to shared record
+        return data_record, (self.table, self.name)
+    
+    def items(self):
+        return ((field, getattr(self, field)) for field in self.__slots__)
+    
+    def __repr__(self):
+        return f"{type(self).__name__}({self.name!r}, {dict(self.items())})"
+
+class Race(Record):
+    __slots__ = ("strength", "dexterity", "constitution", "wisdom", "intelligence", "charisma", "speed", "special_attribute_mod", "hp_per_lvl", "abilities")
+    table = "races"
+
+class ClassInfo(Record):
+    __slots__ = ("hit_dice", "hp_mod", "primary_abilities", "saving_throws", "proficiencies", "abilities")
+    table = "classes"
+
+class Armor(Record):
+    __slots__ = ("type", "armor_class", "max_dex_mod", "weight", "stealth_disadvantage", "strength")
+    table = "armors"
+
+class Shield(Record):
+    __slots__ = ("type", "armor_class", "weight")
+    table = "shields"
+
+class Weapon(Record):
+    __slots__ = ("no_dice", "dice_dmg", "dice_dmg_vers", "damage_type", "reach", "weight", "lh", "properties", "mastery", "proficiency_required", "ability", "grip")
+    table = "weapons"
+
+class ClassLevel(Record):
+    # one level of class progression table, name is level
+    __slots__ = ("prof_bonus", "features", "second_wind", "weapon_mastery", "battle_master", "champion", "eldricht_knight", "psi_warrior")
+    table = "fighter"
+
+class LevelProgression(Record):
+    # everything class gives up to given level, built by Data from class level table, name is (class name, level)
+    __slots__ = ("features", "extra_attacks", "fighting_styles", "second_winds", "weapon_mastery", "prof_bonus")
+    table = "progression"
+
+def data_record(table, name):
+    # shared record by table and name, names of old saves can differ in case ("unarmed")
+    records = getattr(Data(), table)
+    if name not in records and isinstance(name, str):
+        name = next((key for key in records if key.lower() == name.lower()), name)
+    return records[name]
+
 class Data:
     # Class for loading data, Singleton approach
+    # csv tables are compiled into pickle cache (DnD/data.cache), pandas is imported only when cache has to be rebuilt
     _instance = None
     
+    cache_version = 1 # increase when format of tables changes
+    tables = { # attribute: (csv file, key column, encoding, record)
+        "races": ("race.csv", "race", None, Race),
+        "classes": ("classes.csv", "class", "ISO-8859-1", ClassInfo),
+        "armors": ("armors.csv", "armor", None, Armor),
+        "shields": ("shields.csv", "shield", None, Shield),
+        "weapons": ("weapons.csv", "weapon", None, Weapon),
+        "fighter": ("fighter.csv", "level", None, ClassLevel),
+    }
+    
     def __new__(cls, *args, **kwargs):
             if cls._instance is None:
                 cls._instance = super().__new__(cls)
             return cls._instance
     
     def __init__ (self):
-        # if not hasattr(self, 'data_loaded'):  # Check if data is already loaded
-        self.base_dir = os.path.dirname(os.path.abspath(__file__))
-        self.load_all_data()
+        if not getattr(self, 'data_loaded', False):  # Check if data is already loaded, Data() is called for every unpickled character
+            self.base_dir = os.path.dirname(os.path.abspath(__file__))
+            self.cache_path = os.path.join(self.base_dir, 'DnD', 'data.cache')
+            self.load_all_data()
     
     def load_all_data(self):
         # Method to load all data
-        self.races = self.load_races()
-        self.classes = self.load_classes()
-        self.armors = self.load_armors()
-        self.shields = self.load_shields()
-        self.weapons = self.load_weapons()
-        self.fighter = self.load_fighter()
+        tables = self.load_cache()
+        if tables is None:
+            tables = self.build_cache()
+        
+        self.set_records(tables)
         self.data_loaded = True  # Mark that data has been loaded
         
     def reload_data(self):
-        # Method to reload all data
+        # Method to reload all data, always from csv files
         self.data_loaded = False
-        self.load_all_data()
-
-    def load_races(self):
-        file_path = os.path.join(self.base_dir, 'DnD', 'race.csv')
-        data = pd.read_csv(file_path, delimiter=";")
-        races = {}
-        for _,row in data.iterrows():
-            race_name = row["race"]
-            race_info = {col: row[col] for col in data.columns if col!= "race"}
-            races[race_name] = race_info
-        return races
+        self.set_records(self.build_cache())
+        self.data_loaded = True
+    
+    def set_records(self, tables):
+        # {name: record} for every table, cache keeps plain rows
+        for name, table in tables.items():
+            record = self.tables[name][3]
+            setattr(self, name, {key: record(key, row) for key, row in table.items()})
+        self.progression = self.build_progression()
+    
+    def build_progression(self):
+        # {(class name, level): LevelProgression} with cumulative features of all levels up to given one
+        progression = {}
+        for name, (_, _, _, record) in self.tables.items():
+            if record is not ClassLevel:
+                continue
+            features = []
+            for level, level_data in sorted(getattr(self, name).items()):
+                if level_data.features:
+                    features.extend(feature.strip() for feature in level_data.features.split(","))
+                key = (name.title(), level)
+                progression[key] = LevelProgression(key, {
+                    "features": tuple(features),
+                    "extra_attacks": features.count("extra attack"),
+                    "fighting_styles": features.count("fighting style"),
+                    "second_winds": level_data.second_wind,
+                    "weapon_mastery": level_data.weapon_mastery,
+                    "prof_bonus": level_data.prof_bonus,
+                })
+        return progression
+    
+    def get_progression(self, class_name, level):
+        # None for classes without level table
+        return self.progression.get((class_name, level))
+    
+    def source_path(self, file):
+        return os.path.join(self.base_dir, 'DnD', file)
+    
+    def file_hash(self, path):
+        with open(path, "rb") as f:
+            return hashlib.md5(f.read()).hexdigest()
+    
+    def sources(self):
+        # {csv file: (mtime, size, md5)} of current files
+        sources = {}
+        for file, _, _, _ in self.tables.values():
+            stat = os.stat(self.source_path(file))
+            sources[file] = (stat.st_mtime_ns, stat.st_size, self.file_hash(self.source_path(file)))
+        return sources
+    
+    def load_cache(self):
+        # tables from cache or None if cache is missing / old / made from other csv files
+        try:
+            with open(self.cache_path, "rb") as f:
+                cache = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+        
+        if cache.get("version") != self.cache_version or set(cache.get("tables", {})) != set(self.tables):
+            return None
+        
+        # mtime and size are enough when files were not touched, hash is checked only for changed ones (e.g. after git checkout)
+        touched = False
+        for file, (mtime, size, md5) in cache["sources"].items():
+            try:
+                stat = os.stat(self.source_path(file))
+            except OSError:
+                return None
+            if (stat.st_mtime_ns, stat.st_size) != (mtime, size):
+                if self.file_hash(self.source_path(file)) != md5:
+                    return None
+                touched = True
+        
+        # same content with new mtime, cache is written again so next start does not hash files
+        if touched:
+            cache["sources"] = self.sources()
+            self.write_cache(cache)
+        
+        return cache["tables"]
+    
+    def build_cache(self):
+        # read all csv files and write cache
+        tables = {name: self.read_table(name) for name in self.tables}
+        self.write_cache({"version": self.cache_version, "sources": self.sources(), "tables": tables})
+        return tables
+    
+    def write_cache(self, cache):
+        # written to temporary file and renamed, process pool workers starting at the same time never read half written cache
+        # cache is optional (e.g. read only install)
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir = os.path.dirname(self.cache_path), suffix = ".tmp")
+        except OSError:
+            return
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(cache, f, protocol = pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.cache_path)
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
     
-    def load_armors(self):
-        file_path = os.path.join(self.base_dir, 'DnD', 'armors.csv')
-        data = pd.read_csv(file_path, delimiter=";")
+    def read_table(self, name):
+        # {key column value: {other column: value}} from csv
+        import pandas as pd # slow import, only needed for building cache
+        
+        file, key, encoding, _ = self.tables[name]
+        data = pd.read_csv(self.source_path(file), delimiter=";", encoding=encoding)
         data_dict = {}
         for _,row in data.iterrows():
-            data_header = row["armor"]
-            data_info = {col: row[col] for col in data.columns if col!= "armor"}
+            data_header = row[key]
+            data_info = {col: row[col] for col in data.columns if col!= key}
             data_dict[data_header] = data_info
         return data_dict
+
+    def load_table(self, name):
+        record = self.tables[name][3]
+        return {key: record(key, row) for key, row in self.read_table(name).items()}
+
+    def load_races(self):
+        return self.load_table("races")
+    
+    def load_armors(self):
+        return self.load_table("armors")
     
     def load_shields(self):
-        file_path = os.path.join(self.base_dir, 'DnD', 'shields.csv')
-        data = pd.read_csv(file_path, delimiter=";")
-        data_dict = {}
-        for _,row in data.iterrows():
-            data_header = row["shield"]
-            data_info = {col: row[col] for col in data.columns if col!= "shield"}
-            data_dict[data_header] = data_info
-        return data_dict
+        return self.load_table("shields")
     
     def load_weapons(self):
-        file_path = os.path.join(self.base_dir, 'DnD', 'weapons.csv')
-        data = pd.read_csv(file_path, delimiter=";")
-        data_dict = {}
-        for _,row in data.iterrows():
-            data_header = row["weapon"]
-            data_info = {col: row[col] for col in data.columns if col!= "weapon"}
-            data_dict[data_header] = data_info
-        return data_dict
+        return self.load_table("weapons")
     
     def load_classes(self):
-        file_path = os.path.join(self.base_dir, 'DnD', 'classes.csv')
-        data = pd.read_csv(file_path, delimiter=";", encoding='ISO-8859-1')
-        classes = {}
-        for _,row in data.iterrows():
-            classes_name = row["class"]
-            classes_info = {col: row[col] for col in data.columns if col!= "class"}
-            classes[classes_name] = classes_info
-        return classes
+        return self.load_table("classes")
     
     def load_fighter(self):
-        file_path = os.path.join(self.base_dir, 'DnD', 'fighter.csv')
-        data = pd.read_csv(file_path, delimiter=";")
-        data_dict = {}
-        for _,row in data.iterrows():
-            data_header = row["level"]
-            data_info = {col: row[col] for col in data.columns if col!= "level"}
-            data_dict[data_header] = data_info
-        return data_dict
+        return self.load_table("fighter")
     
     def get_races(self):
         return self.races
@@ -124,7 +277,7 @@ class Data:
     
     def get_fighter(self):
         if not hasattr(self, 'fighter'):
-            self.weapons = Data.load_fighter(self)
+            self.fighter = Data.load_fighter(self)
         return self.fighter
         
 class Character:
@@ -169,6 +322,7 @@ class Character:
         self.c_bonus_actions = None
         
         self.position = set()
+        self.context = None # BattleContext character fights in, set by add_character
         self.team = None # 1 team one, 2 team two
         self.control = None #1 AI controlled, 0 player controller
         
@@ -180,6 +334,13 @@ class Character:
         abilities_str = "\n".join([f"{key.capitalize():<15}: {value:>2}" for key, value in self.abilities.items()])
         return (f"\n\nName: {self.name}\nLevel: {self.level}\nRace: {self.race}\nCharacter class: {self.class_name}\nBase HP: {self.instance_hp.base_hp}\nArmor class: {self.instance_armor_class.armor_class}\n::: Abilities :::\n{abilities_str}\n{self.instance_equipment}Default behaviour: {self.behaviour}\nProf. bonus: {self.instance_modifiers.b_prof_bonus}\nTotal bonus to attack: {self.instance_modifiers.attack_mod_w1}\n{self.instance_features}\nSecond winds: {self.instance_fighter.second_winds}\nWeapon mastery: {self.instance_features.weapon_mastery}")
 
+    def log(self, *args, **kwargs):
+        # print through battle of character (silent in headless battles), plain print outside of battle (creation, menu)
+        if self.context is None:
+            print(*args, **kwargs)
+        else:
+            self.context.log(*args, **kwargs)
+    
     @staticmethod
     def get_data_instance():
         # Method to get the singleton instance of the Data class
@@ -192,12 +353,20 @@ class Character:
         state = self.__dict__.copy()
         if 'data' in state:
             del state['data']  # Usunięcie atrybutu data, by nie zapisywać Singletona Data
+        state.pop('context', None) # battle is not saved with character, add_character sets it again
         return state
 
     def __setstate__(self, state):
         # Ustawia stan obiektu podczas wczytywania
         self.__dict__.update(state)
         self.data = Data()  # Ponowne ustawienie odniesienia do Singletona Data
+        self.context = None
+        
+        # older saves keep own copies of csv tables and items as dicts, point them to shared records
+        self.instance_abil.races = self.data.get_races()
+        self.instance_classes.classes = self.data.get_classes()
+        self.instance_hp.classes = self.data.get_classes()
+        self.instance_equipment.intern_items()
     
     @classmethod
     def create_new_character(cls,name):
@@ -220,8 +389,7 @@ class Character:
             character.instance_features.choose_weapon_mastery()
             
         character.instance_equipment.std_equip()
-        character.instance_modifiers.update_attack_mod_w1()
-        character.instance_modifiers.update_attack_mod_w2()
+        character.instance_modifiers.refresh()
         
         return character
     
@@ -249,8 +417,7 @@ class Character:
     
         character.instance_equipment.std_equip()
         character.instance_equipment.auto_first_weapon_init()
-        character.instance_modifiers.update_attack_mod_w1()
-        character.instance_modifiers.update_attack_mod_w2()
+        character.instance_modifiers.refresh()
         
         return character
         
@@ -268,7 +435,7 @@ class Character:
         file_path = os.path.join(folder, filename)
         
         with open(file_path, "rb") as load_file:
-            loaded_character = pickle.load(load_file)
+            loaded_character = CharacterUnpickler(load_file).load()
         self.__dict__.update(loaded_character.__dict__)
         
         Character.re_calculate(self)
@@ -281,12 +448,14 @@ class Character:
                 level = int(input("\nAt what level you want your character to be? Choose between 1 and 20: "))
                 print()
                 self.level = level
+                self.instance_modifiers.invalidate()
                 break
             except:
                 raise ValueError ("Wrong level. Choose again")
     
     def auto_pick_level(self, s, e):
         self.level = rd.randint(s,e)
+        self.instance_modifiers.invalidate()
     
     def choose_race(self):
         print (">>> AVAILABLE RACES <<<")
@@ -300,13 +469,13 @@ class Character:
         return choose_race
     
     def roll_initiative (self):
-        roll = rd.randint(1,20)
+        roll = self.context.rng.roll(20)
         self.initiative = roll + self.instance_abil.abil_modifiers["Dexterity"]
         return self.initiative
     
     def choose_behaviour (self):
-        list = ["ranged", "melee"]
-        choose = input("Choose default behaviour for AI (ranged / melee): ")
+        list = ["ranged", "melee", "mcts"]
+        choose = input("Choose default behaviour for AI (ranged / melee / mcts): ")
         
         if choose in list:
             self.behaviour = choose
@@ -315,16 +484,22 @@ class Character:
     
     def re_calculate(self):
         self.instance_abil.calculate_modifiers()
-        self.instance_modifiers.update_attack_mod_w1()
-        self.instance_modifiers.update_attack_mod_w2()
-        self.instance_modifiers.update_hit_mod_w1()
-        self.instance_armor_class.calculate_ac()
+        self.instance_modifiers.refresh()
         self.instance_hp.update_hp()
         self.instance_hp.status = 1
+        self.instance_hp.death_throw_count_plus = 0
+        self.instance_hp.death_throw_count_minus = 0
         self.team = None # 1 team one, 2 team two
         self.control = None #1 AI controlled, 0 player controller
         
     
+class CharacterUnpickler(pickle.Unpickler):
+    # characters saved while running DnD.py as script are stored as __main__ classes, map them to this module when imported
+    def find_class(self, module, name):
+        if module == "__main__" and name in globals():
+            return globals()[name]
+        return super().find_class(module, name)
+
 class Abilities:
     # there shouldn't be any method that initialize by its own
     def __init__ (self, character):
@@ -414,14 +589,14 @@ class Abilities:
         for key,value in self.races.items():
             if self.character.race == key:
                 for abil, bonus in value.items():
-                    if abil.capitalize() in abilities and pd.notna(bonus):
+                    if abil.capitalize() in abilities and bonus is not None:
                         abilities[abil.capitalize()] += int(bonus)
         return abilities
                         
     def apply_special_bonuses(self, abilities):                    
         # additional exception for half-elf or other races (possible in future 5.5ed), checking for csv abilities and looping over it
         try:
-            bonus_abil = int(self.races[self.character.race].get("special_attribute_mod"))# name of the column, might be dependent on csv, consider to change
+            bonus_abil = int(self.races[self.character.race].special_attribute_mod)# name of the column, might be dependent on csv, consider to change
         except:
             bonus_abil = None
         if self.character.race in self.races and bonus_abil is not None:
@@ -452,6 +627,7 @@ class Abilities:
         for key,value in self.abilities.items():
                 mod[key] = (value - 10) // 2
         self.abil_modifiers = mod
+        self.character.instance_modifiers.invalidate()
         
 class CharacterClass:
     def __init__ (self, character):
@@ -482,9 +658,7 @@ class Fighter:
         self.action_surge = []
     
     def get_second_winds(self):
-        lvl = self.character.level
-        data = self.character.data.get_fighter()
-        self.second_winds = data[lvl]["second_wind"]
+        self.second_winds = self.character.data.get_progression("Fighter", self.character.level).second_winds
     
     
 class ArmorClass:
@@ -500,9 +674,9 @@ class ArmorClass:
 
 
         #base modifier from armor/shield
-        a_0 = armor["armor_class"] if armor is not None else 10
+        a_0 = armor.armor_class if armor is not None else 10
         try:
-            a_1 = shield["armor_class"] if shield is not None else 0
+            a_1 = shield.armor_class if shield is not None else 0
         except:
             a_1 = 0
         
@@ -511,7 +685,7 @@ class ArmorClass:
         
         #check dex mod compared to armor
         dex_mod = self.character.instance_abil.abil_modifiers["Dexterity"]
-        max_dex_mod_armor = armor["max_dex_mod"] if armor is not None else 99
+        max_dex_mod_armor = armor.max_dex_mod if armor is not None else 99
         if dex_mod>max_dex_mod_armor: a_01 = max_dex_mod_armor
         else: a_01 = dex_mod
         
@@ -532,7 +706,7 @@ class HitPoints:
         
     def calc_base_hp (self):
         # calculate hit points on character creation
-        class_hp_dice = self.classes[self.character.class_name]["hit_dice"]
+        class_hp_dice = self.classes[self.character.class_name].hit_dice
         print(f"Calculating base HP for {self.character.name}. Base HP dice is {class_hp_dice}")
         
         #calculating modifiers, for CON additions to HitPoints
@@ -552,7 +726,7 @@ class HitPoints:
         print(f"Base HP, level 1+x + CON {base_hp}")
         
         #check for any classes abilities that permamently increase hit_points
-        hp_mod = self.classes[self.character.class_name].get("hp_mod", 0)
+        hp_mod = self.classes[self.character.class_name].hp_mod or 0
         if hp_mod > 0:
             base_hp += hp_mod * self.character.level
         
@@ -577,18 +751,18 @@ class HitPoints:
 
     def check_status (self, dmg, critical):
         
-        # singleton for accesing instance of CharacterManager
-        character_manager = CharacterManager._instance
+        # battle of this character
+        character_manager = self.character.context
         
         if self.status == 2 and dmg == 0:
             txt = (f"{self.character.name} is already stabilized!") # TODO to be removed
-            print(txt)
+            character_manager.log(txt)
             character_manager.ins_pgame.add_log (txt)
             return 2
         
         if self.status == 2 and dmg > 0 and critical:
             txt = f"{self.character.name} was stabilized, but it is not anymore!"# TODO to be removed
-            print(txt)
+            character_manager.log(txt)
             character_manager.ins_pgame.add_log (txt)
             self.status=0
             self.death_throw_count_plus += 2
@@ -601,18 +775,18 @@ class HitPoints:
         # if dmg was larger than pool hp then dead, set status to -1 /// DURING TURN #TODO needs to be reworked to account for current hp before last attack
         elif dmg>=self.base_hp:
             txt =  (f"{self.character.name} is dead! Damage {dmg} was too big for him to handle it.")
-            print(txt)
+            character_manager.log(txt)
             character_manager.ins_pgame.add_log (txt)
             self.status = -1
             
-            self.character_manager.instance_event_manager.remove_char(self.character)
+            character_manager.instance_event_manager.remove_char(self.character)
             
             return - 1
         
         # first damage to unconscious state, set character to unconscious /// DURING TURN
         elif self.current_hp<=0 and self.status == 1:
             txt =  (f"{self.character.name} is unconscious! Damage {dmg} was too big for him to handle it. He can still be revived")
-            print(txt)
+            character_manager.log(txt)
             character_manager.ins_pgame.add_log (txt)
             self.status = 0
             return 0
@@ -623,14 +797,14 @@ class HitPoints:
         
         # basic check if HP 0 or lower  /// BEFORE TURN
         elif self.current_hp<=0 and self.status==0:
-            roll = rd.randint(1,20)
+            roll = character_manager.rng.roll(20)
             if roll == 20:
                 self.current_hp = 1
                 self.status = 1
                 self.death_throw_count_plus = 0
                 self.death_throw_count_minus = 0
                 txt =  (f"{self.character.name} you are returning back to life!")
-                print(txt)
+                character_manager.log(txt)
                 character_manager.ins_pgame.add_log (txt)
             elif roll >= 10:
                 self.death_throw_count_minus += 1
@@ -640,27 +814,27 @@ class HitPoints:
                 self.death_throw_count_plus += 1
                 
             txt = (f"Death saving roll for {self.character.name}: {roll}, current status: M / P {self.death_throw_count_minus} {self.death_throw_count_plus}")
-            print(txt)
+            character_manager.log(txt)
             character_manager.ins_pgame.add_log (txt)
                 
         #SECOND PART
         # check status based on death_throw_count, outside previous loop
         if self.death_throw_count_plus>=3:
             txt =  (f"{self.character.name} is dead! Death throw count reached 3 or beyond")
-            print(txt)
+            character_manager.log(txt)
             character_manager.ins_pgame.add_log (txt)
             self.death_throw_count_plus = 0
             self.death_throw_count_minus = 0
             self.status = -1
             
-            self.character_manager.instance_event_manager.remove_char(self.character)
+            character_manager.instance_event_manager.remove_char(self.character)
             
             return -1
         
         # return status unconscious, cannot move during
         elif self.death_throw_count_minus>=3:
             txt =  (f"{self.character.name} you are stabilized!")
-            print(txt)
+            character_manager.log(txt)
             character_manager.ins_pgame.add_log (txt)
             self.death_throw_count_plus = 0
             self.death_throw_count_minus = 0
@@ -670,8 +844,12 @@ class HitPoints:
         else:
             return 0
         
-    def decrease_target_hp(self, dmg):
+    def decrease_target_hp(self, dmg, attacker = None):
+        # HP actually removed (no overkill) counts as damage dealt by attacker in battle statistics
+        removed = min(dmg, self.current_hp)
         self.current_hp = max(0, self.current_hp - dmg)
+        if attacker is not None and removed > 0:
+            self.character.context.instance_event_manager.record_damage(attacker, removed)
                 
     
     def heal_itself(self, heal):
@@ -699,25 +877,17 @@ class Features:
     def __str__(self):
         return (f"No. of attacks: {self.extra_atk}\nFighting style: {self.fighting_styles}")
     
+    def level_data (self):
+        # precomputed features / counters of class and level (Data.progression)
+        return self.character.data.get_progression(self.character.class_name, self.character.level)
+    
     def get_all (self):
-        self.list = []
-        char_class = self.character.class_name.lower()
-        method_name = f"get_{char_class}"
-        c_lvl = self.character.level
-        data = getattr(self.character.data, method_name)()
-        
-        for lvl in range (1, c_lvl+1):
-            level_data = data.get(lvl, {})
-            features = level_data.get("features", "")
-            
-            if features:
-                split_features = [feature.strip() for feature in features.split(",")]
-                self.list.extend(split_features)
+        self.list = list(self.level_data().features)
     
     def update_ext_attacks(self):
-        # find a "extra attack" feature in class features and count them TODO, other method two,three
+        # "extra attack" features of class up to current level TODO, other method two,three
         
-        no = self.list.count("extra attack")
+        no = self.level_data().extra_attacks
         self.extra_atk = no+1
         print(self.extra_atk)
     
@@ -733,7 +903,7 @@ class Features:
         self.fighting_styles = []
         self.re_calc_fs()
         i=0
-        no_of_fs = self.list.count("fighting style")
+        no_of_fs = self.level_data().fighting_styles
         
         while i < no_of_fs:
             fs = input("Choose one of the fighting style: ").lower()
@@ -754,7 +924,7 @@ class Features:
         self.fighting_styles = []
         self.re_calc_fs()
         i=0
-        no_of_fs = self.list.count("fighting style")
+        no_of_fs = self.level_data().fighting_styles
         
         while i < no_of_fs:
             fs = rd.choice(list)
@@ -776,24 +946,27 @@ class Features:
         self.character.instance_armor_class.calculate_ac()
         
         self.character.instance_modifiers.fs_dmg_bonus = 0
+        self.character.instance_modifiers.invalidate()
     
     def fs_archery(self):
         # no need to recalculate, constant bonus
         self.character.instance_modifiers.fs_arch_bonus_atk = 2
-        print("Fighting style archery is chosen")
+        self.character.instance_modifiers.invalidate()
+        self.character.log("Fighting style archery is chosen")
     
     def fs_defense(self):
         if self.character.instance_equipment.armor is None:
-            print("Fighting style defense is chosen, but requirements are not met - no armor.")
+            self.character.log("Fighting style defense is chosen, but requirements are not met - no armor.")
             return False
         
-        if self.character.instance_equipment.armor["type"] in ["Light armor", "Medium armor", "Heavy armor"]:
+        if self.character.instance_equipment.armor.type in ["Light armor", "Medium armor", "Heavy armor"]:
             self.character.instance_modifiers.fs_ac = 1
+            self.character.instance_modifiers.invalidate()
             self.character.instance_armor_class.calculate_ac()
             
-            print("Fighting style defense is chosen")
+            self.character.log("Fighting style defense is chosen")
         else:
-            print("Fighting style defense is chosen, but requirements are not met")
+            self.character.log("Fighting style defense is chosen, but requirements are not met")
     
     def fs_dueling(self):
         try:
@@ -801,22 +974,23 @@ class Features:
             
             #reset at the beggining (in case of lost)
             self.character.instance_modifiers.fs_dmg_bonus = 0
+            self.character.instance_modifiers.invalidate()
             
-            wp_1 = self.character.instance_equipment.first_weapon["grip"]
+            wp_1 = self.character.instance_equipment.first_weapon.grip
             wp_2 = self.character.instance_equipment.second_weapon
             
             if wp_1 == "one-handed" and wp_2 == None:
                 self.character.instance_modifiers.fs_dmg_bonus = 2
-                print("Fighting style dueling is active")
+                self.character.log("Fighting style dueling is active")
             else:
-                print("Fighting style dueling is chosen, but requirements are not met")
+                self.character.log("Fighting style dueling is chosen, but requirements are not met")
         except:
-            print("No weapon equipped, dueling fighting style not active. Equip weapon to activate it!")
+            self.character.log("No weapon equipped, dueling fighting style not active. Equip weapon to activate it!")
     
     def fs_great_weapon_fighting(self):
         # method of checking
         try:
-            if self.character.instance_equipment.first_weapon["grip"] == "two-handed" and "great_weapon_fighting" in self.list:
+            if self.character.instance_equipment.first_weapon.grip == "two-handed" and "great_weapon_fighting" in self.list:
                 return True
             else: return False
         except:
@@ -832,10 +1006,8 @@ class Features:
         pass
 
     def choose_weapon_mastery(self):
-        lvl = self.character.level
-        data = self.character.data.get_fighter()
         data_wp = self.character.data.get_weapons()
-        self.weapon_mastery_count = data[lvl]["weapon_mastery"]
+        self.weapon_mastery_count = self.level_data().weapon_mastery
         
         #restarting
         self.weapon_mastery = []
@@ -864,21 +1036,48 @@ class Modifiers:
         self.hit_mod_w1 = None
         self.hit_mod_w2 = None
         
+        self.ability_bonus_w1 = None
+        self.ability_bonus_w2 = None
+        
         self.b_prof_bonus = 0 # basic proficiency bonus resulting from class and level
         self.fs_arch_bonus_atk = 0 # fighting style bonus to ranged weapons
         self.fs_ac = 0 # fighting style bonus to AC
         self.fs_dmg_bonus = 0 # damage bonus from dueling (holding one-handed weapon in two hands)
+        
+        # derived stats above (attack/hit mods, ability bonuses, prof bonus, AC) are calculated once and reused,
+        # equipment / abilities / level / fighting style changes set dirty and refresh recalculates them on next use
+        self.dirty = True
+    
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.dirty = True # saves made before derived stats cache
+    
+    def invalidate(self):
+        self.dirty = True
+    
+    def refresh(self):
+        if not self.dirty:
+            return
+        self.dirty = False
+        
+        self.ability_bonus_w1 = self.get_ability_bonus_w1()
+        self.ability_bonus_w2 = self.get_ability_bonus_w2()
+        self.update_attack_mod_w1()
+        self.update_attack_mod_w2()
+        self.update_hit_mod_w1()
+        self.update_hit_mod_w2()
+        self.character.instance_armor_class.calculate_ac()
     
     def update_ac (self, ac):
         self.ac_modifiers = ac
-        print(f"modify_ac function in Modifiers class, AC value: {ac}")
+        self.character.log(f"modify_ac function in Modifiers class, AC value: {ac}")
         
     def update_attack_mod_w1(self):
         #TODO add multiple bonuses
         
         mod1 = self.get_ability_bonus_w1()
         mod2 = self.get_basic_prof_bonus()
-        mod3 = self.fs_arch_bonus_atk if self.character.instance_equipment.first_weapon["reach"]>10 else 0
+        mod3 = self.fs_arch_bonus_atk if self.character.instance_equipment.first_weapon.reach>10 else 0
         
         sum = mod1+mod2+mod3
         self.attack_mod_w1 = sum
@@ -889,7 +1088,7 @@ class Modifiers:
         try:
             mod1 = self.get_ability_bonus_w2()
             mod2 = self.get_basic_prof_bonus()
-            mod3 = self.fs_arch_bonus_atk if self.character.instance_equipment.offhand["reach"]>10 else 0
+            mod3 = self.fs_arch_bonus_atk if self.character.instance_equipment.offhand.reach>10 else 0
             
             sum = mod1+mod2+mod3
             self.attack_mod_w2 = sum
@@ -909,30 +1108,26 @@ class Modifiers:
         mod1 = self.get_ability_bonus_w2()   
         sum = mod1
         
-        self.hit_mod_w1 =sum
+        self.hit_mod_w2 =sum
     
     def get_ability_bonus_w1(self):
         try:
-            abil = self.character.instance_equipment.first_weapon.get("ability", 0).title()
+            abil = self.character.instance_equipment.first_weapon.ability.title()
             return self.character.instance_abil.abil_modifiers[abil]
         except:
             pass
     
     def get_ability_bonus_w2(self):
         try:
-            abil = self.character.instance_equipment.offhand.get("ability", 0).title()
+            abil = self.character.instance_equipment.offhand.ability.title()
             return self.character.instance_abil.abil_modifiers[abil]
         except:
             pass
     
     
     def get_basic_prof_bonus(self):
-        char_class = self.character.class_name.lower()
-        method_name = f"get_{char_class}"
-        lvl = self.character.level
-        data = getattr(self.character.data, method_name)()
-        
-        prof_bonus = data.get(lvl, {}).get("prof_bonus")
+        level_data = self.character.data.get_progression(self.character.class_name, self.character.level)
+        prof_bonus = level_data.prof_bonus if level_data else None
         self.b_prof_bonus = prof_bonus
         return prof_bonus
 
@@ -961,14 +1156,19 @@ class Equipment:
         self.instrument = None
         self.spellbook = None
     
+    def equip(self, slot, item):
+        # every change of armor / weapons goes through here, derived stats depend on it
+        setattr(self, slot, item)
+        self.character.instance_modifiers.invalidate()
+    
     def std_equip(self):
         armors_list = self.character.data.get_armors()
         armor_choice = "Unarmored"
-        self.armor = {"name": armor_choice, **armors_list[armor_choice]}
+        self.equip("armor", armors_list[armor_choice])
         
         weapon_list = self.character.data.get_weapons()
         weapon_choice = "Unarmed"
-        self.first_weapon = {"name": weapon_choice, **weapon_list[weapon_choice]}
+        self.equip("first_weapon", weapon_list[weapon_choice])
     
     def armor_init(self):
         #TODO choosing armor from list, need to check for proficiency and str required among other stuff
@@ -981,7 +1181,7 @@ class Equipment:
         if armor_choice in armors_list:
             print("New armor equipped!")
             #TODO if new armor it should follow the chain of actions AND: a) update weight (if new armor) b) modify armor class and pass argument about AC and Dex mod, c) check if this type of armor can be worn (probably the first thing) d), check the strength required, probably the second
-            self.armor = {"name": armor_choice, **armors_list[armor_choice]}
+            self.equip("armor", armors_list[armor_choice])
         else:
             print("No armor")
             
@@ -995,13 +1195,13 @@ class Equipment:
 
         if item_choice in item_list:
             #condition - two handed
-            if item_list[item_choice]["grip"] == "two-handed" and self.offhand is not None:
+            if item_list[item_choice].grip == "two-handed" and self.offhand is not None:
                 print("You can't equip two-handed weapon with a shield/second weapon!")
                 return False
 
             print(f"{item_choice} equipped!")
             #TODO if new armor it should follow the chain of actions AND: a) update weight (if new armor) b) modify armor class and pass argument about AC and Dex mod, c) check if this type of armor can be worn (probably the first thing) d), check the strength required, probably the second
-            self.first_weapon = {"name": item_choice, **item_list[item_choice]}
+            self.equip("first_weapon", item_list[item_choice])
         else:
             print("No weapon found")
     
@@ -1016,7 +1216,7 @@ class Equipment:
         if item_choice in item_list:
             print(f"{item_choice} equipped!")
             #TODO if new armor it should follow the chain of actions AND: a) update weight (if new armor) b) modify armor class and pass argument about AC and Dex mod, c) check if this type of armor can be worn (probably the first thing) d), check the strength required, probably the second
-            self.first_weapon = {"name": item_choice, **item_list[item_choice]}
+            self.equip("first_weapon", item_list[item_choice])
         else:
             print("No weapon found")
             
@@ -1027,28 +1227,39 @@ class Equipment:
         
         s_w = input("What do you want to equip? shield or weapon?: ").lower()
         
-        if s_w in ("shield", "weapon") and self.first_weapon["grip"]=="two-handed":
+        if s_w in ("shield", "weapon") and self.first_weapon.grip=="two-handed":
             print("You cannot equip shield/weapon, if you wield two handed weapon")
         elif s_w == "shield":
             for item, stats in shields_list.items():
                 print (f"{item} {stats}", sep = "  ///  ")
             item_choice = "shield"#input("What shield do you want to equip?: ")
-            self.offhand = {"name": item_choice, **shields_list[item_choice]}
+            self.equip("offhand", shields_list[item_choice])
             print(f"{item_choice} equipped!")
         elif s_w == "weapon":
             for item, stats in weapons_list.items():
                 print (f"{item} {stats}", sep = "  ///  ")
             item_choice = input("What weapon as second do you want to equip?: ")
-            if item_choice in weapons_list and weapons_list[item_choice]["lh"]=="light":
-                self.offhand = {"name": item_choice, **weapons_list[item_choice]}
+            if item_choice in weapons_list and weapons_list[item_choice].lh=="light":
+                self.equip("offhand", weapons_list[item_choice])
             else:
                 print("Wrong weapon")
         else:
             print("Wrong!")
     
+    def intern_items(self):
+        # items stored as dicts (saves made before records) replaced with shared records
+        for slot in ("armor", "first_weapon", "offhand"):
+            item = getattr(self, slot)
+            if isinstance(item, dict):
+                if slot == "armor":
+                    table = "armors"
+                else:
+                    table = "shields" if item["name"] in self.character.data.get_shields() else "weapons"
+                self.equip(slot, data_record(table, item["name"]))
+    
     def offhand_unequip(self):
         if self.offhand is not None:
-            self.offhand = None
+            self.equip("offhand", None)
             self.character.instance_armor_class.calculate_ac()
         else:
             print("There is nothing in the second hand!")
@@ -1057,14 +1268,14 @@ class Equipment:
         item_list = self.character.data.get_weapons()
         
         if self.first_weapon is not None:
-            self.first_weapon = {"name": "unarmed", **item_list["Unarmed"]}
+            self.equip("first_weapon", item_list["Unarmed"])
         else:
             print("There is nothing in the second hand!")
             
     def __str__(self):
-        armor_name = self.armor["name"] if self.armor else "No armor"
-        main_weapon_name = self.first_weapon["name"] if self.first_weapon else "no main weapon"
-        offhand_name = self.offhand["name"] if self.offhand else "No shield/offhand"
+        armor_name = self.armor.name if self.armor else "No armor"
+        main_weapon_name = self.first_weapon.name if self.first_weapon else "no main weapon"
+        offhand_name = self.offhand.name if self.offhand else "No shield/offhand"
         
         return (f"Armor: {armor_name}\n"
                 f"Main weapon: {main_weapon_name}\n"
@@ -1101,7 +1312,7 @@ class Action:
         while True:
 
             for action in actions_list:
-                print(f"{action} / ", end="")
+                self.character_manager.log(f"{action} / ", end="")
             
             action_input = input("\nWhat do you want to do? ").lower().strip()
             
@@ -1127,7 +1338,7 @@ class Action:
                 elif action_input == "offhand":
                     character.instance_equipment.offhand_unequip()
             else:
-                print ("Action not recognized or requirements not met. Type 'pass' to skip.")
+                self.character_manager.log("Action not recognized or requirements not met. Type 'pass' to skip.")
 
     def get_possible_actions(self, character):
         
@@ -1153,9 +1364,8 @@ class Action:
         
         if mv_pts>=cost:
             # check if pos is occupied (double condition, but can be useful later)
-            for obj in self.character_manager.characters.values():
-                if obj.position == pos:
-                    return False
+            if pos in self.character_manager.positions:
+                return False
             self.character_manager.instance_action.attack_of_opportunity(char, old_pos, pos)
             self.character_manager.instance_board.update_player_position(char, pos)
             return cost
@@ -1192,42 +1402,30 @@ class Action:
         opposing_team = (self.character_manager.instance_event_manager.team_two if character.team == 1 else self.character_manager.instance_event_manager.team_one)
         
         list_of_targets = []
+        fov = self.character_manager.instance_fov
         
         for target in opposing_team:
             d = self.character_manager.instance_event_manager.distance (character.position, target.position)
-            if character.instance_equipment.first_weapon["reach"] > d:
+            if character.instance_equipment.first_weapon.reach > d and fov.sees(character, target):
                 list_of_targets.append(target)
         return list_of_targets
     
     def choose_ranged_target (self, character):
         
         # check if char can use ranged attack, get possible targets
-        if int(character.instance_equipment.first_weapon["reach"]) > 10:
+        if int(character.instance_equipment.first_weapon.reach) > 10:
             targets = self.get_targets_ranged (character)
-            print (f"Potential targets to attack: {targets}")
+            if not self.character_manager.headless:
+                self.character_manager.log(f"Potential targets to attack: {targets}")
         else:
             return False
         
-        target_dict = {}
-        
-        # check 1st condition - attack modifiers and obstacles along the way   
+        # check 1st condition - attack modifiers and obstacles along the way, all targets at once
         if targets:
-            max_value = -float('inf')
-            for target in targets:
-                value = self.character_manager.instance_algorithms.check_path_to_target(character.position, target.position)
-                target_dict[target] = value
-        
-            
-            if targets:
-                max_value = -float('inf')
-                for target in targets:
-                    current_value = self.character_manager.instance_algorithms.check_path_to_target(character.position, target.position)
-                    if current_value > max_value:
-                        max_value = current_value
-                        best_target = target
-                        print("xxx",best_target)
-                
-                    return best_target
+            scores = self.character_manager.instance_los.cover_scores(character.position, [target.position for target in targets])
+            best_target = targets[int(np.argmax(scores))]
+            self.character_manager.log("Best target:", best_target)
+            return best_target
         else:
             return False
            
@@ -1249,7 +1447,7 @@ class Action:
     def check_advantage (self, character, target):
         # object expected
         if target.instance_hp.status in [-1,0,2]:
-            print (f"{character.name} has an advantage against {target.name}")
+            self.character_manager.log(f"{character.name} has an advantage against {target.name}")
             return True
         return False
     
@@ -1297,7 +1495,7 @@ class Action:
         crit = f". Critical Hit!" if critical else ""
         txt = f"Offhand attack! {character.name} attacks {target.name}: {roll} + {attack_modifier} = {attack_roll},{c_hit}{crit}"
         self.character_manager.ins_pgame.add_log(txt)
-        print(txt)
+        self.character_manager.log(txt)
         
               # calculate damage, check in damage roll function for any immunities/reductions
         if hit:
@@ -1310,12 +1508,12 @@ class Action:
             else: dmg -= red
             
             #after hit decrease target hp and check status
-            target.instance_hp.decrease_target_hp(dmg)
+            target.instance_hp.decrease_target_hp(dmg, character)
             target.instance_hp.check_status(dmg, critical)
             return True
                 
         else:
-            print(f"Target missed")
+            self.character_manager.log(f"Target missed")
             return False
     
     def main_attack (self, character, target):
@@ -1330,7 +1528,7 @@ class Action:
         crit = f". Critical Hit!" if critical else ""
         txt = f"{character.name} attacks {target.name}: {roll} + {attack_modifier} = {attack_roll},{c_hit}{crit}"
         self.character_manager.ins_pgame.add_log(txt)
-        print(txt)
+        self.character_manager.log(txt)
         
         # calculate damage, check in damage roll function for any immunities/reductions
         if hit:
@@ -1343,22 +1541,20 @@ class Action:
             else: dmg -= red
             
             #after hit decrease target hp and check status
-            target.instance_hp.decrease_target_hp(dmg)
+            target.instance_hp.decrease_target_hp(dmg, character)
             target.instance_hp.check_status(dmg, critical)
             return True
                 
         else:
-            print(f"Target missed")
+            self.character_manager.log(f"Target missed")
             return False
                 
     def attack_roll(self, character, target, w):
-        #TODO needs to be calculate only once when variable changes
-        
+        # modifiers are recalculated only after equipment / abilities / level / fighting style change
+        character.instance_modifiers.refresh()
         if w==1:
-            character.instance_modifiers.update_attack_mod_w1()
             attack_modifier = character.instance_modifiers.attack_mod_w1
         elif w==2:
-            character.instance_modifiers.update_attack_mod_w2()
             attack_modifier = character.instance_modifiers.attack_mod_w2
         
         # check if character has additional bonuses against target
@@ -1370,16 +1566,18 @@ class Action:
         #check for protection
         disadvantage = self.protection_check(target, character)
         
+        dice = self.character_manager.rng
+        
         if advantage:
-            roll = max(rd.randint(1, 20), rd.randint(1, 20))
+            roll = dice.evaluate("1d20 adv")
             txt = f"Advantage against target!"
             self.character_manager.ins_pgame.add_log(txt)
         elif disadvantage:
-            roll = min(rd.randint(1, 20), rd.randint(1, 20))
+            roll = dice.evaluate("1d20 dis")
             txt = f"Disadvantage against target!"
             self.character_manager.ins_pgame.add_log(txt)
         else:
-            roll = rd.randint(1,20)
+            roll = dice.evaluate("1d20")
         
         attack_roll = roll + attack_modifier + additional_mod
         
@@ -1388,15 +1586,16 @@ class Action:
     def check_hit(self, roll, attack_roll, target):
         # returning info about hit and if it is critical, booleans
         if roll==20:
-            print ("Critical hit!")
+            self.character_manager.log("Critical hit!")
             return True, True
         elif roll==1:
             return False, False
         else:
+            target.instance_modifiers.refresh()
             x = attack_roll>=target.instance_armor_class.armor_class
             # TODO implement a way for ranged weapons
             if x and target.instance_hp.status in [-1,0,2]:
-                print("Critical hit!")
+                self.character_manager.log("Critical hit!")
                 return True, True
             elif x: return True, False
             else: return False, False
@@ -1406,9 +1605,9 @@ class Action:
         
         # no of dice and type of dice
         if w==1:
-            wp_stat = [(character.instance_equipment.first_weapon["no_dice"]),(character.instance_equipment.first_weapon["dice_dmg"])]
+            wp_stat = [(character.instance_equipment.first_weapon.no_dice),(character.instance_equipment.first_weapon.dice_dmg)]
         elif w==2:
-            wp_stat = [(character.instance_equipment.offhand["no_dice"]),(character.instance_equipment.offhand["dice_dmg"])]
+            wp_stat = [(character.instance_equipment.offhand.no_dice),(character.instance_equipment.offhand.dice_dmg)]
         else:
             raise ValueError ("no wp_stat, no w in previous function")
         
@@ -1420,17 +1619,13 @@ class Action:
         else:
             add_mod = 0
         
-        # damage roll / check for fighting style great_weapon_fighting
-        if not character.instance_features.fs_great_weapon_fighting():
-            if critical:
-                dmg = sum(rd.randint(1,wp_stat[1]) for _ in range(wp_stat[0] * 2))
-            else:
-                dmg = sum(rd.randint(1,wp_stat[1]) for _ in range(wp_stat[0]))
-        else:
-            if critical:
-                dmg = sum(3 if roll in [1, 2] else roll for roll in [rd.randint(1, wp_stat[1]) for _ in range(wp_stat[0] * 2)])
-            else:
-                dmg = sum(3 if roll in [1, 2] else roll for roll in [rd.randint(1, wp_stat[1]) for _ in range(wp_stat[0])])
+        # damage roll, critical doubles number of dice / check for fighting style great_weapon_fighting
+        expression = f"{wp_stat[0]}d{wp_stat[1]}"
+        if character.instance_features.fs_great_weapon_fighting():
+            expression += " GWF"
+        if critical:
+            expression += " crit"
+        dmg = self.character_manager.rng.evaluate(expression)
 
         dmg_sum = dmg + add_mod
         
@@ -1445,7 +1640,7 @@ class Action:
         txt += f" = {dmg_sum}"
                 
         self.character_manager.ins_pgame.add_log(txt)
-        print(txt)
+        self.character_manager.log(txt)
         
         return dmg_sum
     
@@ -1461,14 +1656,14 @@ class Action:
             c.c_actions -=1
         
     def spend_attacks_points(self,c):
-        print(f"DEBUG: attacks: {c.c_attacks} actions: {c.c_actions}")
+        self.character_manager.log(f"DEBUG: attacks: {c.c_attacks} actions: {c.c_actions}")
         if c.c_attacks==0 and c.c_actions>0:
             c.c_actions -= 1
             c.c_attacks = c.instance_features.extra_atk - 1
         elif c.c_attacks>0:
             c.c_attacks -= 1
         else:
-            print(c.c_attacks, c.c_actions )
+            self.character_manager.log(c.c_attacks, c.c_actions )
             raise AttributeError ("No attacks or actions")
         
     def spend_move_pts(self,c):
@@ -1506,11 +1701,11 @@ class Action:
             
             if "interception" in savior.instance_features.fighting_styles and savior.c_reactions>0:
                 if savior.instance_equipment.first_weapon is not None or savior.instance_equipment.offhand is not None:
-                    reduction += rd.randint(1,10) + savior.instance_modifiers.b_prof_bonus
+                    reduction += self.character_manager.rng.roll(10) + savior.instance_modifiers.b_prof_bonus
         
                     txt = f"{savior.name} protects {target.name} from {enemy.name} and reduce {reduction} dmg!"
                     self.character_manager.ins_pgame.add_log(txt)
-                    print(txt)
+                    self.character_manager.log(txt)
                     savior.c_reactions -=1
         
         return reduction if reduction != 0 else False
@@ -1522,11 +1717,11 @@ class Action:
             for char in list:
                 savior = self.character_manager.get_character(char)
                 
-                if "protection" in savior.instance_features.fighting_styles and savior.c_reactions>0 and savior.instance_equipment.offhand["name"]=="shield":
+                if "protection" in savior.instance_features.fighting_styles and savior.c_reactions>0 and savior.instance_equipment.offhand.name=="shield":
             
                         txt = f"{savior.name} tries to disturb {enemy.name} from attacking {target.name}"
                         self.character_manager.ins_pgame.add_log(txt)
-                        print(txt)
+                        self.character_manager.log(txt)
                         savior.c_reactions -=1
                         return True
         except:
@@ -1538,7 +1733,7 @@ class Action:
         #additional condition for human Player
 
         if c.instance_fighter.c_second_winds>0 and c.c_bonus_actions>0:
-            heal = rd.randint(1,10) + c.level
+            heal = self.character_manager.rng.roll(10) + c.level
         
             c.instance_hp.heal_itself(heal)
             
@@ -1547,12 +1742,12 @@ class Action:
             
             txt = f"{c.name} uses second wind ability and heal itself for  {heal} points"
             self.character_manager.ins_pgame.add_log(txt)
-            print(txt)
+            self.character_manager.log(txt)
         else:
-            print("No more uses of second wind!")
+            self.character_manager.log("No more uses of second wind!")
     
     def cleave(self, c, t=None):
-        print("Start cleave logic")
+        self.character_manager.log("Start cleave logic")
         c.instance_features.c_no_cleave -= 1
         #check target for AI
         if not t:
@@ -1564,15 +1759,15 @@ class Action:
         # if hitted - go with cleave logic, pick random target that is adjacent both to first target and attacker
         if check_for_cleave:
             e = self.character_manager.instance_algorithms.check_char_surround(t)
-            print("e", e)
+            self.character_manager.log("e", e)
             te = [self.character_manager.get_character(ally) for ally in e]
-            print("te", te)
+            self.character_manager.log("te", te)
             cleave_t = [enemy for enemy in te if self.character_manager.instance_algorithms.is_adjacent(c.position, enemy.position)]
-            print("cleave_t", cleave_t)
-            t2 = rd.choice(cleave_t) if cleave_t else False
+            self.character_manager.log("cleave_t", cleave_t)
+            t2 = self.character_manager.rng.choice(cleave_t) if cleave_t else False
             
             if t2:
-                roll, attack_modifier, attack_roll = self.attack_roll(c, t2)
+                roll, attack_modifier, attack_roll = self.attack_roll(c, t2, 1)
                 hit, critical = self.check_hit(roll, attack_roll, t2)
                 
                 if hit:
@@ -1580,7 +1775,7 @@ class Action:
                     cleave = f"Cleave attack! "
                     txt = f"{cleave}{c.name} attacks {t2.name}: {roll} + {attack_modifier} = {attack_roll} Target hit{crit}"
                     self.character_manager.ins_pgame.add_log(txt)
-                    print(txt)
+                    self.character_manager.log(txt)
                     
                     # check reaction (for now: interception)
                     red = self.interception_check(t2, c)
@@ -1591,17 +1786,17 @@ class Action:
                     else: dmg -= red
                     
                     #after hit decrease target hp and check status
-                    t2.instance_hp.decrease_target_hp(dmg)
+                    t2.instance_hp.decrease_target_hp(dmg, c)
                     status = t2.instance_hp.check_status(dmg, critical)
                     if status == -1:
                         self.character_manager.instance_event_manager.remove_char(t2)
-                        print (f"Removing {t2.name} in main attack function from list")
+                        self.character_manager.log(f"Removing {t2.name} in main attack function from list")
                 else:
-                    print(f"Target missed")
+                    self.character_manager.log(f"Target missed")
                     cleave = f"Cleave attack! "
                     txt = f"{cleave}{c.name} attacks {t2.name}: {roll} + {attack_modifier} = {attack_roll} Target miss"
                     self.character_manager.ins_pgame.add_log(txt)
-                    print(txt)
+                    self.character_manager.log(txt)
                     return 
             else:
                 return False                
@@ -1614,8 +1809,8 @@ class Action:
             t = self.character_manager.instance_AI.target
         
         if not self.main_attack(c,t):
-            dmg = c.instance_modifiers.get_ability_bonus_w1()
-            t.instance_hp.decrease_target_hp(dmg)
+            dmg = c.instance_modifiers.ability_bonus_w1
+            t.instance_hp.decrease_target_hp(dmg, c)
             t.instance_hp.check_status(dmg, False)
     
     def push(self,c,t):
@@ -1636,40 +1831,312 @@ class InitiativeTracker:# TODO, maybe in the future
             print(f"{character.name}: {character.initiative}")
     ...
 
-class CharacterManager:
-    _instance = None  # Zmienna klasy do przechowywania instancji singletonu
-
-    def __new__(cls, *args, **kwargs):
-        if cls._instance is None:
-            # Tworzymy instancję, jeśli nie istnieje
-            cls._instance = super(CharacterManager, cls).__new__(cls)
-        return cls._instance
+class DiceExpression:
+    # parsed dice expression, e.g. "2d6", "1d8+3", "2d6 GWF crit", "1d20 adv"
+    # flags: crit - dice doubled, GWF - great weapon fighting (1 and 2 count as 3), adv / dis - best / worst of two rolls
+    pattern = re.compile(r"^\s*(\d*)\s*d\s*(\d+)\s*([+-]\s*\d+)?\s*(.*)$", re.IGNORECASE)
+    flags = {"crit", "gwf", "adv", "dis"}
+    
+    def __init__ (self, text):
+        match = self.pattern.match(text)
+        if not match:
+            raise ValueError (f"Wrong dice expression: {text}")
+        
+        number, sides, modifier, flags = match.groups()
+        flags = {f.lower() for f in flags.split()}
+        if flags - self.flags:
+            raise ValueError (f"Unknown flags {flags - self.flags} in dice expression: {text}")
+        
+        self.text = text
+        self.number = int(number) if number else 1
+        self.sides = int(sides)
+        self.modifier = int(modifier.replace(" ", "")) if modifier else 0
+        self.crit = "crit" in flags
+        self.gwf = "gwf" in flags
+        self.adv = "adv" in flags
+        self.dis = "dis" in flags
+        
+        self.count = self.number * 2 if self.crit else self.number # dice rolled
+    
+    def __repr__ (self):
+        return f"DiceExpression({self.text!r})"
+
+class Dice:
+    # random source for battles, one per BattleContext, seeded per battle (start_headless_combat / Simulator)
+    # numpy Generator draws rolls in blocks, one pool for every die size; single roll is just list pop
+    block = 1024
+    
+    def __init__ (self, seed = None):
+        self.seed(seed)
+    
+    expressions = {} # {text: DiceExpression}, shared cache of parsed expressions
+    
+    def seed (self, seed = None):
+        self.generator = np.random.default_rng(seed)
+        self.pools = {} # {sides: [pre drawn rolls]}
+        self.floats = []
+    
+    def parse (self, text):
+        expression = self.expressions.get(text)
+        if expression is None:
+            expression = self.expressions[text] = DiceExpression(text)
+        return expression
+    
+    def roll (self, sides):
+        # one die, 1..sides
+        pool = self.pools.get(sides)
+        if not pool:
+            pool = self.pools[sides] = self.generator.integers(1, sides + 1, self.block).tolist()
+        return pool.pop()
+    
+    def rolls (self, n, sides):
+        return [self.roll(sides) for _ in range(n)]
+    
+    def evaluate (self, text):
+        # single result of dice expression, same rules as Action: crit doubles dice, GWF 1-2 -> 3, adv / dis on every die
+        e = self.parse(text)
+        
+        if e.adv or e.dis:
+            pick = max if e.adv else min
+            rolls = [pick(self.roll(e.sides), self.roll(e.sides)) for _ in range(e.count)]
+        else:
+            rolls = self.rolls(e.count, e.sides)
+        
+        if e.gwf:
+            return sum(3 if roll in [1, 2] else roll for roll in rolls) + e.modifier
+        return sum(rolls) + e.modifier
     
-    def __init__ (self):
-        if not hasattr(self, '_initialized'):
-            self.instance_action = Action(self)
-            self.instance_algorithms = Algorithms(self)
-            self.instance_conditions = Conditions(self)
-            self.instance_event_manager = EventManager(self)
-            self.instance_AI = AI(self)
-            self.instance_player = Player(self)
-            self.instance_board = Board(self)
-            
-            self.event_queue = queue.Queue()
-            self.ins_pgame = Pgame(self)
-            
-            self.characters = {}
-            self.initiative_order = []
+    def random (self):
+        # float in [0, 1)
+        if not self.floats:
+            self.floats = self.generator.random(self.block).tolist()
+        return self.floats.pop()
+    
+    def below (self, n):
+        # integer 0..n-1, for any n (no pool per size)
+        return int(self.random() * n)
+    
+    def randint (self, a, b):
+        return a + self.below(b - a + 1)
+    
+    def choice (self, seq):
+        return seq[self.below(len(seq))]
+    
+    def shuffle (self, seq):
+        for i in range(len(seq) - 1, 0, -1):
+            j = self.below(i + 1)
+            seq[i], seq[j] = seq[j], seq[i]
+
+class DamageCalculator:
+    # exact damage distributions (PMF - numpy array, index = damage, value = probability) for melee attacks
+    # mirrors Action: attack_roll / check_hit / damage_roll / main_attack / graze / interception_check
+    def __init__ (self, character_manager):
+        self.character_manager = character_manager
+        self.dice_cache = {} # {(number, sides, gwf): pmf}
+    
+    def dice_pmf (self, number, sides, gwf = False):
+        # sum of number dice, GWF - 1 and 2 count as 3
+        key = (number, sides, gwf)
+        pmf = self.dice_cache.get(key)
+        if pmf is None:
+            one = np.zeros(max(sides, 3) + 1)
+            one[1:sides + 1] = 1 / sides
+            if gwf:
+                one[3] += one[1] + one[2]
+                one[1] = one[2] = 0
             
-        self._initialized = True  
+            pmf = np.ones(1)
+            for _ in range(number):
+                pmf = np.convolve(pmf, one)
+            self.dice_cache[key] = pmf
+        return pmf
+    
+    def d20_pmf (self, advantage = False, disadvantage = False):
+        # index 1..20
+        faces = np.arange(21)
+        if advantage:
+            pmf = (faces**2 - (faces - 1)**2) / 400
+        elif disadvantage:
+            pmf = ((21 - faces)**2 - (20 - faces)**2) / 400
+        else:
+            pmf = np.full(21, 1 / 20)
+        pmf[0] = 0
+        return pmf
+    
+    def hit_chances (self, attack_mod, armor_class, advantage = False, disadvantage = False, helpless = False):
+        # (miss, hit, critical) probabilities, helpless target (unconscious / stabilized) - every hit is critical
+        d20 = self.d20_pmf(advantage, disadvantage)
+        faces = np.arange(21)
+        
+        critical = d20[20]
+        hit = d20[(faces > 1) & (faces < 20) & (faces + attack_mod >= armor_class)].sum()
+        if helpless:
+            critical, hit = critical + hit, 0.0
+        return 1 - hit - critical, hit, critical
+    
+    def apply (self, pmf, fn):
+        # distribution of fn(damage)
+        values = np.array([fn(dmg) for dmg in range(len(pmf))])
+        result = np.zeros(max(values.max(), 0) + 1)
+        np.add.at(result, values, pmf)
+        return result
+    
+    def add (self, pmf, other, weight = 1.0):
+        # weighted sum of two PMFs with different lengths
+        result = np.zeros(max(len(pmf), len(other)))
+        result[:len(pmf)] += pmf
+        result[:len(other)] += other * weight
+        return result
+    
+    def damage_pmf (self, number, sides, modifier, critical = False, gwf = False, red = 0):
+        # damage_roll and main_attack: dice + modifier, reduction in damage_roll, then once more in main_attack
+        def reduce (dmg):
+            dmg = max(dmg + modifier, 0)
+            dmg = 0 if red >= dmg else dmg - red
+            return dmg if red >= dmg else dmg - red
+        return self.apply(self.dice_pmf(number * 2 if critical else number, sides, gwf), reduce)
+    
+    def interceptors (self, t):
+        # proficiency bonuses of allies around target that can use interception now (same checks as interception_check)
+        bonuses = []
+        for name in self.character_manager.instance_algorithms.check_char_surround(t):
+            savior = self.character_manager.get_character(name)
+            if "interception" in savior.instance_features.fighting_styles and savior.c_reactions > 0:
+                if savior.instance_equipment.first_weapon is not None or savior.instance_equipment.offhand is not None:
+                    bonuses.append(savior.instance_modifiers.b_prof_bonus)
+        return bonuses
+    
+    def reduction_pmf (self, bonuses):
+        # sum of 1d10 + prof for every interceptor, index = reduction
+        pmf = np.ones(1)
+        for bonus in bonuses:
+            pmf = np.convolve(pmf, np.concatenate((np.zeros(bonus), self.dice_pmf(1, 10))))
+        return pmf
+    
+    def hit_pmf (self, c, critical, red_pmf):
+        # damage of one hit with first weapon, reduction given as distribution
+        weapon = c.instance_equipment.first_weapon
+        gwf = bool(c.instance_features.fs_great_weapon_fighting())
+        result = np.zeros(1)
+        for red, p in enumerate(red_pmf):
+            if p > 0:
+                result = self.add(result, self.damage_pmf(weapon.no_dice, weapon.dice_dmg, c.instance_modifiers.hit_mod_w1, critical, gwf, red), p)
+        return result
+    
+    def attack_parts (self, c, t):
+        # (miss, hit without interception, hit with interception) PMFs, weighted by their probabilities
+        action = self.character_manager.instance_action
+        miss, hit, critical = self.hit_chances(c.instance_modifiers.attack_mod_w1, t.instance_armor_class.armor_class,
+                                               action.check_advantage(c, t), action.check_disadvantage(c, t), t.instance_hp.status in [-1,0,2])
+        
+        # graze, ability modifier on miss
+        graze = max(c.instance_modifiers.ability_bonus_w1 or 0, 0) if self.character_manager.instance_conditions.can_graze(c) else 0
+        miss_pmf = np.zeros(graze + 1)
+        miss_pmf[graze] = miss
+        
+        no_red = np.ones(1)
+        red = self.reduction_pmf(self.interceptors(t))
+        plain = self.add(self.hit_pmf(c, False, no_red) * hit, self.hit_pmf(c, True, no_red), critical)
+        reduced = self.add(self.hit_pmf(c, False, red) * hit, self.hit_pmf(c, True, red), critical)
+        return miss_pmf, plain, reduced
+    
+    def attack_pmf (self, c, t):
+        # damage of single attack of c against t
+        miss_pmf, plain, reduced = self.attack_parts(c, t)
+        return self.add(miss_pmf, reduced)
+    
+    def round_pmf (self, c, t, attacks = None):
+        # total damage of all attacks in one action (extra attack), interception reacts only on first hit (reactions)
+        attacks = attacks or c.instance_features.extra_atk or 1
+        miss_pmf, plain, reduced = self.attack_parts(c, t)
+        
+        ready = np.ones(1) # interception still available
+        used = np.zeros(1)
+        for _ in range(attacks):
+            ready, used = np.convolve(ready, miss_pmf), self.add(np.convolve(ready, reduced), np.convolve(used, self.add(miss_pmf, plain)))
+        return self.add(ready, used)
+    
+    def expected_dpr (self, c, t):
+        pmf = self.round_pmf(c, t)
+        return float(np.dot(np.arange(len(pmf)), pmf))
+    
+    def kill_probability (self, c, t):
+        # chance that one action drops target to 0 HP
+        pmf = self.round_pmf(c, t)
+        return float(pmf[t.instance_hp.current_hp:].sum())
+
+class BattleContext:
+    # one battle: characters, board, event manager (teams, turns), AI and dice; every subsystem gets it in constructor as character_manager
+    # contexts are independent, many battles can run in one process (threads) as long as each has its own Character objects
+    # battle output goes through log (not redirected stdout, which is shared by all threads)
+    def __init__ (self, headless = False):
+        self.headless = headless # no pygame window, no logs, no delays
+        self.profiling = False # measure calls and time of every behaviour tree node (AI.node_stats), switched by AI.profile
+        
+        self.instance_action = Action(self)
+        self.instance_algorithms = Algorithms(self)
+        self.instance_conditions = Conditions(self)
+        self.instance_event_manager = EventManager(self)
+        self.instance_AI = AI(self)
+        self.instance_player = Player(self)
+        self.instance_board = Board(self)
+        self.instance_pathfinder = PathFinder(self)
+        self.instance_los = LineOfSight(self)
+        self.instance_fov = FieldOfView(self)
+        self.instance_damage = DamageCalculator(self)
+        self.instance_planner = MCTSPlanner(self)
+        self.instance_state = BattleState(self)
+        
+        self.rng = Dice() # battle rolls
+        
+        self.event_queue = queue.Queue()
+        self.ins_pgame = NullPgame(self) if headless else Pgame(self) # only one context at a time can have pygame window
+        self.gui_pgame = None
+        
+        self.characters = {}
+        self.initiative_order = []
+        self.positions = {} # spatial index {position: character}, updated by Board
           
+    def set_headless(self, headless):
+        # switch between pygame window and null renderer
+        if headless == self.headless:
+            return
+        self.headless = headless
+        
+        if headless:
+            self.gui_pgame = self.ins_pgame
+            self.ins_pgame = NullPgame(self)
+        else:
+            self.ins_pgame = self.gui_pgame if self.gui_pgame else Pgame(self)
+    
+    def log(self, *args, **kwargs):
+        # print for battle messages, nothing in headless mode
+        if not self.headless:
+            print(*args, **kwargs)
+    
+    def close(self):
+        # battle is over, release resources kept between turns (MCTS worker processes)
+        self.instance_planner.close()
+    
+    def delay(self, seconds):
+        # pause so player can follow AI actions, skipped in headless mode
+        if not self.headless:
+            time.sleep(seconds)
+    
     def add_character(self, character):
         self.characters[character.name] = character
+        character.context = self
+    
+    def load_saved(self, names):
+        # load characters from saved folder by name
+        for name in names:
+            character = Character(name=name).load_character(f"{name}.pkl")
+            self.add_character(character)
     
     def get_character(self, name):
         character = self.characters.get(name, None)
         if character is None:
-            print(f"Character '{name}' not found in characters.")
+            self.log(f"Character '{name}' not found in characters.")
         return character
     
     def roll_initiative_for_all(self):
@@ -1682,9 +2149,25 @@ class CharacterManager:
         self.initiative_order.sort(key=lambda x: x[1], reverse=True)
     
     def display_turn_order(self):
-        print("Initiative rolls:")
+        self.log("Initiative rolls:")
         for name, initiative in self.initiative_order:
-            print(f"{name}: {initiative}")
+            self.log(f"{name}: {initiative}")
+
+class CharacterManager(BattleContext):
+    _instance = None  # Zmienna klasy do przechowywania instancji singletonu
+    # battle of main menu, shared by whole game; other battles (simulations, planners, threads) create their own BattleContext
+
+    def __new__(cls, *args, **kwargs):
+        if cls._instance is None:
+            # Tworzymy instancję, jeśli nie istnieje
+            cls._instance = super(CharacterManager, cls).__new__(cls)
+        return cls._instance
+    
+    def __init__ (self, headless = False):
+        if not hasattr(self, '_initialized'):
+            super().__init__(headless)
+            
+        self._initialized = True  
 
 class Player:
     def __init__ (self, character_manager):
@@ -1694,7 +2177,7 @@ class Player:
         self.actions_pts = None
         
     def player_turn (self, character):
-        print(f"\n>>> {character.name} turn <<<\n")
+        self.character_manager.log(f"\n>>> {character.name} turn <<<\n")
         
         #update board
         self.character_manager.ins_pgame.update_pygame(character)
@@ -1707,7 +2190,7 @@ class Player:
         
     def interpret (self, char, pos):
         #interpret what user click on Pygame board and do appropriate action
-        print (f"DEBUG: interpret function, for {char.name} on pos: {pos}")
+        self.character_manager.log(f"DEBUG: interpret function, for {char.name} on pos: {pos}")
         
         if self.character_manager.instance_algorithms.is_enemy (char, pos):
             e = self.character_manager.instance_algorithms.get_char_from_pos (pos)
@@ -1724,17 +2207,13 @@ class Player:
         return False
         
     def is_char (self, pos):
-        for obj in self.character_manager.characters.values():
-            if obj.position == pos:
-                return True
-        return False
-        ...
+        return pos in self.character_manager.positions
     
     def valid_enemy (self, char, enemy):
         #check the distance to the target
         check = self.character_manager.instance_algorithms.distance(char.position, enemy.position)
         
-        dist = True if char.instance_equipment.first_weapon["reach"]>check and char.instance_equipment.first_weapon["reach"]>10 else False
+        dist = True if char.instance_equipment.first_weapon.reach>check and char.instance_equipment.first_weapon.reach>10 else False
         
         if enemy.instance_hp.status>-1 and (self.character_manager.instance_algorithms.is_adjacent_reach(char, enemy) or dist==True):
             return True
@@ -1742,60 +2221,159 @@ class Player:
             return False
 
 class Node:
-    def __init__(self, children = None):
+    def __init__(self, children = None, name = None):
         self.children = children if children else []
+        self.name = name or type(self).__name__
+        self.calls = 0
+        self.elapsed = 0.0
     
     def add_child(self, child):
         self.children.append(child)
     
-    def run():
+    def tick(self, bb):
+        # run node with blackboard, with time measurement if profiling is on (BattleContext.profiling)
+        if not bb.character_manager.profiling:
+            return self.run(bb)
+        
+        start = time.perf_counter()
+        result = self.run(bb)
+        self.elapsed += time.perf_counter() - start
+        self.calls += 1
+        return result
+    
+    def run(self, bb):
         pass
+    
+    def walk(self, path = ""):
+        # (path, node) for node and all its children
+        path = f"{path}/{self.name}" if path else self.name
+        yield path, self
+        for child in self.children:
+            yield from child.walk(path)
 
 class Selector(Node):
-    def run(self):
+    def run(self, bb):
         for child in self.children:
-            if child.run():
+            if child.tick(bb):
                 return True
         return False
     
 class Sequence(Node):
-    def run(self):
+    def run(self, bb):
         for child in self.children:
-            if not child.run():
+            if not child.tick(bb):
                 return False
         return True
 
 class ConditionNode(Node):
+    # condition_fn(character, *args) from Conditions
     def __init__(self, condition_fn, *args):
+        super().__init__(name = condition_fn.__name__)
         self.condition_fn = condition_fn
         self.args = args
     
-    def run(self):
-        # Wywołujemy condition_fn z argumentami
-        result = self.condition_fn(*self.args)
-        print(f"Condition {self.condition_fn.__name__} returned {result}")
+    def run(self, bb):
+        # Wywołujemy condition_fn z argumentami, wynik pamiętany do następnej akcji
+        result = bb.remember((self.name,) + self.args, self.condition_fn, bb.character, *self.args)
+        bb.character_manager.log(f"Condition {self.name} returned {result}")
         return result
     
 class ActionNode(Node):
-    
+    # action_fn(character, *args) from Action / Algorithms / Conditions, always succeeds
     def __init__(self, action_fn, *args):
+        super().__init__(name = action_fn.__name__)
         self.action_fn = action_fn
         self.args = args
-        self.character_manager = CharacterManager()
 
-    def run(self):
-        self.action_fn(*self.args)
-        print(f"Action {self.action_fn.__name__} executed.")
+    def run(self, bb):
+        self.action_fn(bb.character, *self.args)
+        bb.invalidate(Blackboard.changes.get(self.name))
+        bb.character_manager.log(f"Action {self.name} executed.")
         
-        if self.character_manager.ins_pgame:
-            self.character_manager.ins_pgame.main_loop()
+        if bb.character_manager.ins_pgame:
+            bb.character_manager.ins_pgame.main_loop()
 
-        time.sleep(0.5)
+        bb.character_manager.delay(0.5)
         return True
-         
+
+class Blackboard:
+    # state of one AI turn shared by all nodes of behaviour tree, trees are built once and get blackboard on every tick
+    # conditions and scores (target, cost field, hit probabilities, threat) are memoized until an action changes state they depend on
+    # state: "hp" - HP / status / teams, "board" - positions, "points" - actions / attacks / move points, "target" - picked target
+    depends = {
+        "melee": set(), "ranged": set(), "surr_threaten": set(),
+        "surr_safe": {"hp"}, "surr_danger": {"hp"},
+        "pick_target": {"hp", "board"}, "pick_target_ranged": {"hp", "board"},
+        "have_actions_or_attacks": {"points"}, "have_actions": {"points"}, "have_mv_pts": {"points"},
+        "target_adj": {"board", "target"},
+        "target_in_sight": {"board", "points", "target"}, "target_outof_sight": {"board", "points", "target"},
+        "can_cleave": {"board", "points", "target"},
+        "hp": {"hp"}, "hit": {"hp"}, "threat": {"hp"}, "distance": {"board"}, "field": {"board"}, "cover": {"board"},
+        "damage": {"hp", "board"}, "kill": {"hp", "board"},
+    }
+    changes = {
+        "spend_move_pts": {"points"}, "spend_attacks_points": {"points"}, "spend_action_points": {"points"}, "dash": {"points"},
+        "AI_move": {"board", "points", "hp"}, # attacks of opportunity
+        "pre_attack": {"hp", "board", "points"}, "cleave": {"hp", "board", "points"}, # dead character leaves board
+        "use_second_wind": {"hp", "points"},
+        "pick_target": {"target"},
+    }
+    
+    def __init__(self, character_manager, character):
+        self.character_manager = character_manager
+        self.character = character
+        self._target = None
+        
+        self.memo = {} # {key: (result, depends)}
+        self.hits = 0
+        self.misses = 0
+    
+    @property
+    def target(self):
+        return self._target
+    
+    @target.setter
+    def target(self, target):
+        if target is not self._target:
+            self._target = target
+            self.invalidate({"target"})
+    
+    def remember(self, key, fn, *args):
+        # key is name of condition / score (first element if tuple), used to look up what it depends on
+        if key in self.memo:
+            self.hits += 1
+            return self.memo[key][0]
+        
+        self.misses += 1
+        result = fn(*args)
+        self.memo[key] = (result, self.depends.get(key[0] if isinstance(key, tuple) else key))
+        return result
+    
+    def invalidate(self, changes = None):
+        # forget results depending on changed state, everything if changes unknown; unknown dependencies are always forgotten
+        if changes is None:
+            self.memo.clear()
+            return
+        self.memo = {key: value for key, value in self.memo.items() if value[1] is not None and not (value[1] & changes)}
+    
 class Conditions:
     def __init__ (self, character_manager):
         self.character_manager = character_manager
+        
+        # weights of target scores for pick_target (melee) and pick_target_ranged, each score normalized to max 100
+        # available: hp, hit, threat, distance, damage (expected damage per round), kill (chance to drop target this round)
+        # optional columns without weight here ("cover", "damage", "kill") are not calculated, see Algorithms.target_scores
+        self.profiles = {
+            "melee": {"hp": 0.20, "hit": 0.20, "threat": 0.25, "distance": 0.35},
+            "ranged": {"hp": 0.50, "hit": 0.20, "threat": 0.10, "distance": 0.20},
+        }
+    
+    def remember(self, key, c, fn, *args):
+        # memoized on blackboard when c is acting AI character, computed directly otherwise
+        bb = self.character_manager.instance_AI.blackboard
+        if bb is None or bb.character is not c:
+            return fn(*args)
+        return bb.remember(key, fn, *args)
     
     def surr_safe(self,c):
     # TODO implement a full method that is mutually exclusive with two other
@@ -1814,75 +2392,39 @@ class Conditions:
         else: return False
     
     def melee(self,c):
-        return True if c.behaviour == "melee" else False
+        return True if c.behaviour in ["melee", "mcts"] else False # mcts - melee tree in planner rollouts
     
     def ranged(self,c):
-         return True if c.behaviour == "ranged" and c.instance_equipment.first_weapon["reach"]>10 else False
+         return True if c.behaviour == "ranged" and c.instance_equipment.first_weapon.reach>10 else False
     
     def pick_target(self, c):
-        
-        # TODO think if this function needs to return False at some point
-        print("pick target function")
-        final_weight = {}
-        self.alg = self.character_manager.instance_algorithms
-        
-        opposing_team = (self.character_manager.instance_event_manager.team_two if c.team == 1 else self.character_manager.instance_event_manager.team_one)
-        
-        if not opposing_team: return False
-        
-        hp_dict = self.alg.check_hp (opposing_team) # check HP score
-        hit_dict = self.alg.check_hit_prob(c, opposing_team) # check how hard is to hit the target
-        dis_dict = self.alg.check_dist_melee (opposing_team, c) # check cost move to target from char position
-        threat_dict = self.alg.check_threat (c, opposing_team) # check threat level
-        
-        print(f"DEBUG: HP: { {character.name: score for character, score in hp_dict.items()} } HIT: { {character.name: score for character, score in hit_dict.items()} } distance: { {character.name: score for character, score in dis_dict.items()} } threat: { {character.name: score for character, score in threat_dict.items()} }")
-        
-        for enemy in hp_dict.keys():
-            hp_score = hp_dict[enemy] * 0.20
-            hit_score = hit_dict[enemy] * 0.20
-            threat_score = threat_dict[enemy] * 0.25
-            dis_score = dis_dict[enemy] * 0.35
-
-            total_score = (hp_score + hit_score + threat_score + dis_score) / 4
-
-            final_weight[enemy] = total_score
-
-        target = max(final_weight, key=final_weight.get)
-        print(f"Picked target (based on weight) is: {target.name}")
-        
-        # update target information in AI class, from what other function can draw
-        self.character_manager.instance_AI.target = target
-        return True
+        self.character_manager.log("pick target function")
+        return self.pick_target_profile(c, "melee")
     
     def pick_target_ranged(self, c):
-        print("Pick target - ranged behaviour")
-        final_weight = {}
+        self.character_manager.log("Pick target - ranged behaviour")
+        return self.pick_target_profile(c, "ranged")
+    
+    def pick_target_profile(self, c, profile):
+        # score all enemies at once (Algorithms.target_scores) with weights of given profile, best one becomes AI target
         self.alg = self.character_manager.instance_algorithms
         
         opposing_team = (self.character_manager.instance_event_manager.team_two if c.team == 1 else self.character_manager.instance_event_manager.team_one)
         
         if not opposing_team: return False
         
-        #all normalized to max 100
-        hit_dict = self.alg.check_hit_prob(c, opposing_team) # check how hard is to hit the target
-        hp_dict = self.alg.check_hp (opposing_team) # check % of HP
-        dis_dict = self.alg.check_dist_melee (opposing_team, c) # check cost move to target from char position
-        threat_dict = self.alg.check_threat (c, opposing_team) # check threat level
+        # ranged attacker scores only enemies it can see (FieldOfView), all of them if nobody is in sight (has to move first)
+        if profile == "ranged":
+            fov = self.character_manager.instance_fov
+            opposing_team = [e for e in opposing_team if fov.sees(c, e)] or opposing_team
         
-        # print(f"DEBUG: HP: { {character.name: score for character, score in hp_dict.items()} } AC: { {character.name: score for character, score in ac_dict.items()} } distance: { {character.name: score for character, score in dis_dict.items()} } threat: { {character.name: score for character, score in threat_dict.items()} }")
+        total, columns = self.alg.target_scores(c, opposing_team, self.profiles[profile])
         
-        for enemy in hp_dict.keys():
-            hp_score = hp_dict[enemy] * 0.50
-            hit_score = hit_dict[enemy] * 0.20
-            threat_score = threat_dict[enemy] * 0.10
-            dis_score = dis_dict[enemy] * 0.20
-
-            total_score = (hp_score + hit_score + threat_score + dis_score) / 4
-
-            final_weight[enemy] = total_score
-
-        target = max(final_weight, key=final_weight.get)
-        print(f"Picked target (based on weight) is: {target.name}")
+        if not self.character_manager.headless:
+            self.character_manager.log(f"DEBUG: { {name: {e.name: round(float(x), 2) for e, x in zip(opposing_team, column)} for name, column in columns.items()} }")
+        
+        target = opposing_team[int(np.argmax(total))]
+        self.character_manager.log(f"Picked target (based on weight) is: {target.name}")
         
         # update target information in AI class, from what other function can draw
         self.character_manager.instance_AI.target = target
@@ -1910,7 +2452,7 @@ class Conditions:
         # can move within actual mv_points
         t = self.character_manager.instance_AI.target
         mv = c.c_move_points
-        cost = self.character_manager.instance_algorithms.check_target_cost (c, t.position)
+        cost = self.remember("field", c, self.character_manager.instance_algorithms.cost_field, c).ring_cost(t.position)
         
         return True if mv>=cost else False
 
@@ -1918,7 +2460,7 @@ class Conditions:
         # can move within actual mv_points
         t = self.character_manager.instance_AI.target
         mv = c.c_move_points
-        cost = self.character_manager.instance_algorithms.check_target_cost (c, t.position)
+        cost = self.remember("field", c, self.character_manager.instance_algorithms.cost_field, c).ring_cost(t.position)
         
         return True if mv<=cost else False
     
@@ -1926,8 +2468,8 @@ class Conditions:
         if not t:
             t = self.character_manager.instance_AI.target
         
-        c1 = True if c.instance_equipment.first_weapon["mastery"]=="cleave" else False
-        c2 = True if c.instance_equipment.first_weapon["name"].title() in c.instance_features.weapon_mastery else False
+        c1 = True if c.instance_equipment.first_weapon.mastery=="cleave" else False
+        c2 = True if c.instance_equipment.first_weapon.name.title() in c.instance_features.weapon_mastery else False
         c3 = True if c.instance_features.c_no_cleave>0 else False
         c4 = True if self.character_manager.instance_algorithms.is_adjacent_reach(c,t) else False
         
@@ -1938,26 +2480,26 @@ class Conditions:
     
     def can_graze(self, c):
         return (
-            (c.instance_equipment.first_weapon.get("mastery") == "graze" and c.instance_equipment.first_weapon.get("name", "").title() in c.instance_features.weapon_mastery) or
-            (c.instance_equipment.offhand.get("mastery") == "graze" and c.instance_equipment.offhand.get("name", "").title() in c.instance_features.weapon_mastery)
+            (c.instance_equipment.first_weapon.mastery == "graze" and c.instance_equipment.first_weapon.name.title() in c.instance_features.weapon_mastery) or
+            (getattr(c.instance_equipment.offhand, "mastery", None) == "graze" and c.instance_equipment.offhand.name.title() in c.instance_features.weapon_mastery)
     )
     
     def can_bonus_attack(self, c):
-        x = c.instance_equipment.first_weapon.get("lh") == "light"
-        y = c.instance_equipment.offhand.get("lh") == "light"
-        z = (c.instance_equipment.first_weapon.get("mastery") != "nick" and c.b_actions>0)
+        x = c.instance_equipment.first_weapon.lh == "light"
+        y = getattr(c.instance_equipment.offhand, "lh", None) == "light" # shield or nothing in second hand
+        z = (c.instance_equipment.first_weapon.mastery != "nick" and c.b_actions>0)
         
         return True if (x and y) and (c.bonus_actions>0) else False
     
     def can_nick(self, c):
-        x = c.instance_equipment.first_weapon.get("lh") == "light"
-        y = c.instance_equipment.offhand.get("lh") == "light"
-        z = (c.instance_equipment.first_weapon.get("mastery") == "nick" and c.c_bonus_actions>0)
+        x = c.instance_equipment.first_weapon.lh == "light"
+        y = getattr(c.instance_equipment.offhand, "lh", None) == "light" # shield or nothing in second hand
+        z = (c.instance_equipment.first_weapon.mastery == "nick" and c.c_bonus_actions>0)
         
         return True if (x and y) and (z) else False
 
     def can_push(self,c,t):
-        x = c.instance_equipment.first_weapon["mastery"] == "push"
+        x = c.instance_equipment.first_weapon.mastery == "push"
         y = self.character_manager.instance_algorithms.is_adjacent_reach(c,t)
         s = t.size in ["large", "normal", "small", "tiny"]
         
@@ -1967,92 +2509,425 @@ class AI:
     def __init__ (self, character_manager):
         self.character_manager = character_manager
         
-        self.target = None
+        self.blackboard = None # of current (last) AI turn
+        self.pending_target = None # target set before any blackboard exists, taken over by next blackboard
         self.pass_cost = 0
+        
+        self.max_ticks = 20 # limit of behaviour tree runs per turn in headless battles, protects batch runs against tree that never fails
+        self.trees = {} # {behaviour: compiled behaviour tree}
 
     
     def AI_turn (self, c):
-        print(f"\nAI {c.name} move")
+        self.character_manager.log(f"\nAI {c.name} move")
         
         self.character_manager.ins_pgame.update_pygame (c)
-        time.sleep(0.5)
+        self.character_manager.delay(0.5)
         
         self.character_manager.instance_action.reset_turn(c)
         
-        self.con = self.character_manager.instance_conditions
-        self.act = self.character_manager.instance_action
-        self.alg = self.character_manager.instance_algorithms
+        bb = self.new_blackboard(c)
+        
+        # MCTS planner, inside of planner rollouts character falls back to behaviour tree
+        planner = self.character_manager.instance_planner
+        if c.behaviour == "mcts" and not planner.planning:
+            planner.play_turn(c)
+            return
         
-        self.target = None  
+        bt = self.get_tree(planner.fallback if c.behaviour == "mcts" else c.behaviour)
         
-        bt =  Selector([
-                Sequence([ # melee behaviour
-                    ConditionNode(self.con.melee, c),
+        ticks = 0
+        max_ticks = self.max_ticks if self.character_manager.headless else float('inf') # GUI turns run until tree fails, as before
+        while bt and ticks < max_ticks and bt.tick(bb):
+            ticks += 1
+            self.character_manager.delay(1)
+        
+        if self.character_manager.profiling:
+            self.character_manager.log(f"DEBUG: path cache {self.character_manager.instance_algorithms.cache_info()} blackboard hits {bb.hits} misses {bb.misses}")
+    
+    @property
+    def target (self):
+        # target picked in current AI turn, kept on blackboard
+        return self.blackboard.target if self.blackboard else self.pending_target
+    
+    @target.setter
+    def target (self, target):
+        if self.blackboard:
+            self.blackboard.target = target
+        else:
+            self.pending_target = target
+    
+    def new_blackboard (self, c):
+        # blackboard for turn of c, starts with target set while there was no blackboard
+        self.blackboard = Blackboard(self.character_manager, c)
+        self.blackboard.target, self.pending_target = self.pending_target, None
+        return self.blackboard
+    
+    def get_tree (self, behaviour):
+        # behaviour trees are built once per behaviour and reused by all characters
+        if behaviour not in self.trees:
+            builder = {"melee": self.build_melee, "ranged": self.build_ranged}.get(behaviour)
+            self.trees[behaviour] = builder() if builder else None
+        return self.trees[behaviour]
+    
+    def build_melee (self):
+        con = self.character_manager.instance_conditions
+        act = self.character_manager.instance_action
+        alg = self.character_manager.instance_algorithms
+        
+        return Sequence([ # melee behaviour
+                    ConditionNode(con.melee),
                     Selector([
                         Sequence([ # safe
-                            ConditionNode(self.con.surr_safe, c),
-                            ConditionNode(self.con.pick_target, c),
+                            ConditionNode(con.surr_safe),
+                            ConditionNode(con.pick_target),
                             Selector([
                                 Sequence([ # enemy is near
-                                    ConditionNode(self.con.target_adj,c),
-                                    ConditionNode(self.con.can_cleave, c),
-                                    self.cleave_attack_bh(c),
-                                    #self.main_attack_bh(c),
-                                    ]),
+                                    ConditionNode(con.target_adj),
+                                    ConditionNode(con.can_cleave),
+                                    self.cleave_attack_bh(),
+                                    #self.main_attack_bh(),
+                                    ], "enemy near"),
                                 Sequence([ # enemy is within standard move points
-                                    ConditionNode(self.con.target_in_sight,c), 
-                                    ConditionNode(self.con.have_actions_or_attacks, c),
-                                    ConditionNode(self.con.have_mv_pts, c),
-                                    ActionNode(self.alg.AI_move, c),
-                                    ActionNode(self.act.spend_move_pts, c),
-                                    self.main_attack_bh(c)
-                                    ]),
+                                    ConditionNode(con.target_in_sight), 
+                                    ConditionNode(con.have_actions_or_attacks),
+                                    ConditionNode(con.have_mv_pts),
+                                    ActionNode(alg.AI_move),
+                                    ActionNode(act.spend_move_pts),
+                                    self.main_attack_bh()
+                                    ], "enemy in move range"),
                                 Sequence([ # enemy is within dash move points
-                                    ConditionNode(self.con.have_mv_pts, c),
-                                    ConditionNode(self.con.target_outof_sight,c), 
-                                    ActionNode(self.act.dash, c),
-                                    ActionNode(self.alg.AI_move, c),
-                                    ActionNode(self.act.spend_move_pts, c),
-                                    ConditionNode(self.con.target_adj,c),
-                                    self.main_attack_bh(c)
-                                    ])
-                                ])
-                            ]),
+                                    ConditionNode(con.have_mv_pts),
+                                    ConditionNode(con.target_outof_sight), 
+                                    ActionNode(act.dash),
+                                    ActionNode(alg.AI_move),
+                                    ActionNode(act.spend_move_pts),
+                                    ConditionNode(con.target_adj),
+                                    self.main_attack_bh()
+                                    ], "enemy in dash range")
+                                ], "engage")
+                            ], "safe"),
                         Sequence([ # threaten
-                                ConditionNode(self.con.surr_threaten, c)
-                                ]),
+                                ConditionNode(con.surr_threaten)
+                                ], "threaten"),
                         Sequence([ # danger
-                                ConditionNode(self.con.surr_danger, c),
-                                ConditionNode(self.con.have_actions, c),
-                                ActionNode(self.act.use_second_wind,c),
-                                ActionNode(self.act.spend_action_points,c)
-                                ])      
-                            ]),
-                        ]),
-                Sequence([ # TODO ranged behaviour
-                    ConditionNode(self.con.ranged, c), # check for behaviour and weapon
-                    ActionNode(self.con.pick_target, c)
-                    ])
-            ])
-        
-        while bt.run():
-            time.sleep(1)
-            ...
-
-    def main_attack_bh(self, c):
+                                ConditionNode(con.surr_danger),
+                                ConditionNode(con.have_actions),
+                                ActionNode(act.use_second_wind),
+                                ActionNode(act.spend_action_points)
+                                ], "danger")      
+                            ], "situation"),
+                        ], "melee")
+    
+    def build_ranged (self):
+        con = self.character_manager.instance_conditions
+        
+        return Sequence([ # TODO ranged behaviour
+                    ConditionNode(con.ranged), # check for behaviour and weapon
+                    ActionNode(con.pick_target)
+                    ], "ranged")
+
+    def main_attack_bh(self):
+        con = self.character_manager.instance_conditions
+        act = self.character_manager.instance_action
         return Sequence([
-                    ConditionNode(self.con.have_actions_or_attacks, c),
-                    ActionNode(self.act.pre_attack, c),
-                    ActionNode(self.act.spend_attacks_points, c)
-                    ])
-    
-    def cleave_attack_bh(self, c):
+                    ConditionNode(con.have_actions_or_attacks),
+                    ActionNode(act.pre_attack),
+                    ActionNode(act.spend_attacks_points)
+                    ], "main attack")
+    
+    def cleave_attack_bh(self):
+        con = self.character_manager.instance_conditions
+        act = self.character_manager.instance_action
         return Sequence([
-                    ConditionNode(self.con.have_actions_or_attacks, c),
-                    ActionNode(self.act.cleave, c),
-                    ActionNode(self.act.spend_attacks_points, c)
-        ])
-    
+                    ConditionNode(con.have_actions_or_attacks),
+                    ActionNode(act.cleave),
+                    ActionNode(act.spend_attacks_points)
+        ], "cleave attack")
+    
+    def profile (self, flag = True):
+        # turn on / off per node time measurement, counters are reset when turned on
+        self.character_manager.profiling = flag
+        for tree in self.trees.values():
+            if tree and flag:
+                for _, node in tree.walk():
+                    node.calls, node.elapsed = 0, 0.0
+    
+    def node_stats (self):
+        # [(path, calls, total ms, mean us)] for every node of built trees, most expensive first
+        stats = []
+        for tree in self.trees.values():
+            if tree:
+                for path, node in tree.walk():
+                    if node.calls:
+                        stats.append((path, node.calls, node.elapsed * 1000, node.elapsed / node.calls * 1e6))
+        return sorted(stats, key=lambda x: x[2], reverse=True)
+    
+worker_context = None # BattleContext of process pool worker (simulations, MCTS rollouts)
+
+def mcts_worker_init():
+    # process pool initializer for MCTS rollouts, battle state is sent with every search
+    global worker_context
+    worker_context = BattleContext(headless = True)
+
+def mcts_worker_run(payload, budget, iterations, seed):
+    # rollouts in worker process, returns {candidate label: [visits, value sum]}
+    planner = worker_context.instance_planner
+    c = planner.import_state(payload)
+    candidates = planner.candidates(c)
+    stats = planner.search(c, candidates, budget, iterations, seed)
+    return {planner.label(candidate): stat for candidate, stat in zip(candidates, stats)}
+
+class MCTSPlanner:
+    # Monte Carlo tree search for characters with behaviour "mcts"
+    # root actions are whole turn plans built from Action primitives (move + attack, dash, cleave, second wind, hold) for every enemy,
+    # chosen by UCB1; rollouts play the rest of the battle with EventManager.play_round (behaviour trees) for a few rounds
+    def __init__ (self, character_manager):
+        self.character_manager = character_manager
+        
+        self.budget = 0.25 # seconds per turn, GUI battles
+        self.iterations = None # fixed number of rollouts per turn instead of time budget (reproducible)
+        self.headless_iterations = 50 # rollouts per turn in headless battles (simulator) when iterations is not set, time budget would make seeded battles differ
+        self.depth = 3 # rounds played in rollout after planned turn
+        self.exploration = 0.7 # UCB1 constant, rollout values are 0-1
+        self.fallback = "melee" # behaviour tree of mcts characters inside rollouts
+        self.workers = 1 # > 1 - rollouts split between processes (root parallelization)
+        
+        self.planning = False
+        self.rng = Dice() # rollouts do not use battle dice
+        self.pool = None
+        self.last = {} # {label: (visits, mean value)} of last search, for debugging
+    
+    def turn_iterations(self):
+        # None - time budget
+        if self.iterations:
+            return self.iterations
+        return self.headless_iterations if self.character_manager.headless else None
+    
+    def label(self, candidate):
+        kind, t = candidate
+        return f"{kind} {t.name}" if t else kind
+    
+    def candidates(self, c):
+        con = self.character_manager.instance_conditions
+        opposing_team = (self.character_manager.instance_event_manager.team_two if c.team == 1 else self.character_manager.instance_event_manager.team_one)
+        second_wind = c.class_name == "Fighter" and c.instance_fighter.c_second_winds > 0 and c.c_bonus_actions > 0
+        
+        candidates = []
+        for t in opposing_team:
+            candidates.append(("attack", t))
+            if not con.target_adj(c, t):
+                candidates.append(("dash", t))
+            elif c.class_name == "Fighter" and con.can_cleave(c, t):
+                candidates.append(("cleave", t))
+        if second_wind:
+            candidates.append(("second wind", None)) # once, not once per enemy (same prior as other plans)
+        candidates.append(("hold", None))
+        return candidates
+    
+    def step(self, fn, *args):
+        # same as ActionNode, refresh window and wait after every action (nothing in headless / rollouts)
+        fn(*args)
+        self.character_manager.ins_pgame.main_loop()
+        self.character_manager.delay(0.5)
+    
+    def execute(self, c, candidate):
+        # plays turn plan of c with Action / Algorithms primitives
+        kind, t = candidate
+        con = self.character_manager.instance_conditions
+        act = self.character_manager.instance_action
+        alg = self.character_manager.instance_algorithms
+        em = self.character_manager.instance_event_manager
+        
+        self.character_manager.instance_AI.target = t
+        opposing_team = em.team_two if c.team == 1 else em.team_one
+        
+        if kind == "hold":
+            return
+        
+        if kind == "second wind":
+            self.step(act.use_second_wind, c)
+        
+        if kind == "dash":
+            if con.have_actions(c):
+                self.step(act.dash, c)
+                self.step(alg.AI_move, c)
+                self.step(act.spend_move_pts, c)
+            return
+        
+        if kind == "cleave" and con.can_cleave(c, t) and con.have_actions_or_attacks(c):
+            self.step(act.cleave, c, t)
+            self.step(act.spend_attacks_points, c)
+        
+        # move next to target and attack while possible
+        if t in opposing_team and not con.target_adj(c, t) and con.have_mv_pts(c):
+            self.step(alg.AI_move, c)
+            self.step(act.spend_move_pts, c)
+        
+        while c.instance_hp.status == 1 and t in opposing_team and con.target_adj(c, t) and con.have_actions_or_attacks(c):
+            self.step(act.pre_attack, c, t)
+            self.step(act.spend_attacks_points, c)
+    
+    def play_turn(self, c):
+        candidates = self.candidates(c)
+        
+        if self.workers > 1 and len(candidates) > 1:
+            stats = self.search_parallel(c, candidates)
+        elif len(candidates) > 1:
+            stats = self.search(c, candidates, self.budget, self.turn_iterations())
+        else:
+            stats = [[1, 0.5]]
+        
+        self.last = {self.label(candidate): (visits, total / visits if visits else 0) for candidate, (visits, total) in zip(candidates, stats)}
+        best = max(range(len(candidates)), key=lambda i: stats[i][0])
+        
+        txt = f"{c.name} plans: {self.label(candidates[best])} ({stats[best][0]} of {sum(v for v, _ in stats)} rollouts)"
+        self.character_manager.ins_pgame.add_log(txt)
+        self.character_manager.log(txt)
+        
+        self.execute(c, candidates[best])
+    
+    def search(self, c, candidates, budget, iterations = None, seed = None):
+        # UCB1 over candidates, returns [[visits, value sum]] in candidates order
+        character_manager = self.character_manager
+        em = character_manager.instance_event_manager
+        
+        root = self.save()
+        members = em.team_one + em.team_two
+        index = em.turn_index
+        
+        # rollouts are silent and use own dice, seeded from battle dice so seeded battles stay reproducible
+        battle_rng = character_manager.rng
+        self.rng.seed(seed if seed is not None else int(battle_rng.generator.integers(2**32)))
+        character_manager.rng = self.rng
+        headless = character_manager.headless
+        character_manager.set_headless(True)
+        self.planning = True
+        
+        stats = [[0, 0.0] for _ in candidates]
+        start = time.perf_counter()
+        n = 0
+        try:
+            while n < len(candidates) or (n < iterations if iterations else time.perf_counter() - start < budget):
+                i = n if n < len(candidates) else self.select(stats, n)
+                value = self.rollout(c, candidates[i], members, index)
+                self.load(root)
+                stats[i][0] += 1
+                stats[i][1] += value
+                n += 1
+        finally:
+            self.planning = False
+            character_manager.set_headless(headless)
+            character_manager.rng = battle_rng
+            self.load(root)
+        
+        return stats
+    
+    def close(self):
+        # stop worker processes of search_parallel, new pool is created if planner is used again
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+    
+    def search_parallel(self, c, candidates):
+        # same search in worker processes, visits and values are added up per candidate
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(max_workers = self.workers, initializer = mcts_worker_init)
+        
+        payload = self.export_state(c)
+        iterations = self.turn_iterations()
+        iterations = -(-iterations // self.workers) if iterations else None
+        seeds = [int(s) for s in self.character_manager.rng.generator.integers(2**32, size = self.workers)]
+        futures = [self.pool.submit(mcts_worker_run, payload, self.budget, iterations, seed) for seed in seeds]
+        
+        stats = [[0, 0.0] for _ in candidates]
+        for future in futures:
+            result = future.result()
+            for i, candidate in enumerate(candidates):
+                visits, total = result.get(self.label(candidate), (0, 0.0))
+                stats[i][0] += visits
+                stats[i][1] += total
+        return stats
+    
+    def select(self, stats, n):
+        # UCB1
+        log_n = np.log(n)
+        return max(range(len(stats)), key=lambda i: stats[i][1] / stats[i][0] + self.exploration * sqrt(log_n / stats[i][0]))
+    
+    def rollout(self, c, candidate, members, index):
+        em = self.character_manager.instance_event_manager
+        
+        self.execute(c, candidate)
+        
+        winner = em.check_winner() or em.play_round(index + 1, ai_only = True)
+        rounds = 0
+        while not winner and rounds < self.depth:
+            em.reactions_manage()
+            winner = em.play_round(0, ai_only = True)
+            rounds += 1
+        
+        return self.evaluate(c.team, winner, members)
+    
+    def evaluate(self, team, winner, members):
+        # 1 - win, 0 - defeat, otherwise 0.5 +- half of difference in average remaining HP of both teams
+        if winner:
+            return 1.0 if winner == team else 0.0
+        
+        def hp (group):
+            return sum(max(m.instance_hp.current_hp, 0) / m.instance_hp.base_hp for m in group if m.instance_hp.status != -1) / max(len(group), 1)
+        
+        own = [m for m in members if m.team == team]
+        enemies = [m for m in members if m.team != team]
+        return 0.5 + 0.5 * (hp(own) - hp(enemies))
+    
+    def save(self):
+        # battle state + AI turn state of acting character
+        AI = self.character_manager.instance_AI
+        return self.character_manager.instance_state.save(), AI.pass_cost, AI.blackboard
+    
+    def load(self, state):
+        AI = self.character_manager.instance_AI
+        snapshot, AI.pass_cost, AI.blackboard = state
+        self.character_manager.instance_state.restore(snapshot)
+    
+    def export_state(self, c):
+        # whole battle for worker process
+        character_manager = self.character_manager
+        em = character_manager.instance_event_manager
+        board = character_manager.instance_board
+        return pickle.dumps({
+            "characters": character_manager.characters, "initiative": character_manager.initiative_order,
+            "team_one": [m.name for m in em.team_one], "team_two": [m.name for m in em.team_two],
+            "turn_index": em.turn_index, "acting": c.name,
+            "size": board.size, "board_signs": board.board_signs, "terrain": board.terrain,
+        })
+    
+    def import_state(self, payload):
+        # battle from export_state, returns acting character
+        state = pickle.loads(payload)
+        character_manager = self.character_manager
+        em = character_manager.instance_event_manager
+        board = character_manager.instance_board
+        
+        character_manager.characters = {}
+        for character in state["characters"].values():
+            character_manager.add_character(character)
+        character_manager.initiative_order = state["initiative"]
+        board.size, board.board_signs = state["size"], state["board_signs"]
+        board.create_blank_board()
+        board.terrain[:] = state["terrain"]
+        board.terrain_version += 1
+        
+        em.team_one = [character_manager.characters[name] for name in state["team_one"]]
+        em.team_two = [character_manager.characters[name] for name in state["team_two"]]
+        for m in em.team_one + em.team_two:
+            position, m.position = m.position, set()
+            board.update_player_position(m, position)
+        em.turn_index = state["turn_index"]
+        
+        c = character_manager.characters[state["acting"]]
+        character_manager.instance_AI.new_blackboard(c)
+        return c
+
 class Melee_behaviour():
     def __init__ (self, AIclass):
         self.AIclass = AIclass
@@ -2132,17 +3007,20 @@ class EventManager:
         self.control_team_one = None
         self.control_team_two = None
         
-        # board and move variables
-        self.path_queue = {}
-        self.visited = {}
-        
         self.char = None # active char turn
+        
+        self.winner = None # 1 or 2 - winning team, 0 - draw (round limit)
+        self.rounds = 0
+        self.damage_dealt = {} # {character name: damage dealt in current battle}
     
     def reset_game (self):
         for c in self.character_manager.characters.values():
             if c.class_name == "Fighter":
                 c.instance_fighter.c_second_winds = c.instance_fighter.second_winds
     
+    def record_damage (self, character, dmg):
+        self.damage_dealt[character.name] = self.damage_dealt.get(character.name, 0) + dmg
+    
     def reactions_manage (self):
         for c in self.character_manager.characters.values():
             c.c_reactions = c.reactions
@@ -2171,185 +3049,57 @@ class EventManager:
             cost = 7.5
 
         # check if new pos is hill, if is cost x2
-        if self.character_manager.instance_board.i_board[y2][x2] == self.character_manager.instance_board.board_signs[2]:
+        if self.character_manager.instance_board.terrain[y2, x2] == Board.HILL:
             cost *=2
             
         return cost
     
-    def calc_path(self, old_pos, tar_pos, cost_old):
-        # print(f"DEBUG Checking {old_pos}:")
-        x, y = old_pos
-        surround = {}
-        
-        moves = [
-            (-1, -1), (0, -1), (1, -1),
-            (-1, 0),          (1, 0),
-            (-1, 1),  (0, 1),  (1, 1) 
-        ]
-        
-        for dx, dy in moves:
-            new_x, new_y = x + dx, y + dy
-            pos = new_x, new_y
-
-            # Sprawdzenie, czy nowe współrzędne są w granicach planszy i nie były wcześniej odwiedzone
-            if 0 <= new_x < len(self.character_manager.instance_board.p_board[0]) and 0 <= new_y < self.character_manager.instance_board.size and pos not in self.visited:
-                # Sprawdzenie, czy pole jest oznaczone jako "E"
-                if self.character_manager.instance_board.p_board[new_y][new_x] in self.character_manager.instance_board.board_signs:
-                    d = self.distance([new_x, new_y], tar_pos)
-                    cost = self.move_cost([new_x, new_y], [x, y]) + cost_old
-                    total = d + cost
-                    surround[(new_x, new_y)] = (cost, d, total, old_pos)
-        
-        #print(f"DEBUG: calc_path, {surround} \n\n")
-        return surround
-
     def check_move(self, character, target_pos):
         # return cost of reaching target position
+        target_pos = tuple(target_pos)
+        settled, _ = self.character_manager.instance_pathfinder.search(character.position, target_pos)
         
-        min_pos = None
-        self.path_queue = {}
-        # for initial position, total dist = dist
-        self.visited[character.position] = (0, self.distance(character.position, target_pos), self.distance(character.position, target_pos), None)
+        if target_pos not in settled:
+            self.character_manager.log("Target out of reach")
+            return float('inf')
         
-        while True:
-            min_cost_pos = 0
-            min_cost = float('inf')
-            
-            # first node, if no items in queue
-            if not self.path_queue:
-                self.path_queue = self.calc_path(character.position, target_pos, 0)
-            
-            # iterate through queue and find optimal path (min_pos) for the cost (min_cost_pos)
-            for position, values in self.path_queue.items():
-                cost, distance, total_cost, parent = values
-                if total_cost < min_cost:
-                    min_pos = position
-                    min_cost_pos = cost
-                    min_distance = distance
-                    min_cost = total_cost
-                    min_parent = parent
-                 
-            # #checking if position is beyond character ability to move /// PLAYER
-            # if move_points<min_cost_pos and is_Player:
-            #     print("Target out of reach")
-            #     self.path_queue.clear()
-            #     self.visited.clear()
-            #     return False
-            
-            # checking if pos is at target destination /// PLAYER and AI
-            if min_pos == target_pos: #and is_Player and move_points>=min_cost_pos:
-                print("Character reached destination")
-                self.path_queue.clear()
-                self.visited.clear()
-                print("1", min_cost_pos)
-                return int(min_cost_pos)
-            
-            #removing to be checked node from queue
-            self.path_queue.pop(min_pos, None)
-            
-            # adding to be checked node to visited dict
-            print("2", min_pos, min_cost_pos, min_distance, min_cost, min_parent)
-            self.visited[min_pos] = (min_cost_pos, min_distance, min_cost, min_parent)
-            
-            #calculating position around new position
-            new_positions = self.calc_path(min_pos, target_pos, min_cost_pos)
-
-            # adding new node to be checked if cost is lower
-            for pos, vals in new_positions.items():
-                if pos not in self.path_queue or vals[2] < self.path_queue[pos][2]:
-                    self.path_queue[pos] = vals
+        self.character_manager.log("Character reached destination")
+        return int(settled[target_pos][0])
     
     def AI_check_move(self, character, target_pos, move_points, is_Player = False):
-        print(f"DEBUG: Char {character.position} to target {target_pos} movepoints: {move_points}")
-        #initialize variable
-        
-        min_pos = None
-        adjacent_results = {}
-        self.path_queue = {}
-        
-        # for initial position, total dist = dist
-        self.visited[character.position] = (0, self.distance(character.position, target_pos), self.distance(character.position, target_pos), None)
+        self.character_manager.log(f"DEBUG: Char {character.position} to target {target_pos} movepoints: {move_points}")
         
         # list of all possible (empty) adjacent square around target, goal is to calculate all space around them
         target_neighbors = self.character_manager.instance_board.check_surrounding_occupied(target_pos)
-            
-        while True:
-            min_cost = float('inf')
-            
-            # first node, if no items in queue
-            if not self.path_queue:
-                self.path_queue = self.calc_path(character.position, target_pos, 0)
-            
-            # iterate through queue and find optimal path (min_pos) for the cost (min_cost_pos)
-            for position, values in self.path_queue.items():
-                cost, distance, total_cost, parent = values
-                if total_cost < min_cost:
-                    min_pos = position
-                    min_cost_pos = cost
-                    min_distance = distance
-                    min_cost = total_cost
-                    min_parent = parent
-                    
-                    #print (f"DEBUG New cheapest found COST: POSITION: {min_pos} COST: {min_cost_pos} DISTANCE: {min_distance} TOTAL DISTANCE: {min_cost}")
-            
-            # checking if founded position is in neighbors, if True, removing neighbors from the list
-            if min_pos in target_neighbors and is_Player == False:
-                adjacent_results[min_pos] = self.path_queue[min_pos]
-                target_neighbors.remove(min_pos)
-                #print (f"DEBUG: Path found. min_pos is in neigbbours {min_pos} neighbor: {target_neighbors}")
         
-            if not target_neighbors:
-                break
-            
-            #removing to be checked node from queue
-            #print(f"DEBUG: remove from queue {min_pos}")
-            self.path_queue.pop(min_pos, None)
-            
-            # adding to be checked node to visited dict
-            #print(f"DEBUG: adding to visited: {min_pos} with values: {min_cost_pos} / {min_distance} / {min_cost} / {parent}")
-            self.visited[min_pos] = (min_cost_pos, min_distance, min_cost, min_parent)
-            
-            #calculating position around new position
-            #print(f"DEBUG: calculating calcpath for: {min_pos}")
-            new_positions = self.calc_path(min_pos, target_pos, min_cost_pos)
-
-            # adding new node to be checked if cost is lower
-            for pos, vals in new_positions.items():
-                if pos not in self.path_queue or vals[2] < self.path_queue[pos][2]:
-                    self.path_queue[pos] = vals
-                    #print(f"{pos} added to checked queue")
+        # neighbors are returned in order in which A* settled them, visited keeps parents for building path back
+        adjacent_results, visited = self.character_manager.instance_pathfinder.search(character.position, target_pos, target_neighbors)
         
-        #checking if position is beyond character ability to move AI /// outside loop
-
-        #adding last node to visited
-        self.visited[min_pos] = (min_cost_pos, min_distance, min_cost, min_parent)
-        # print(f"Adjacent result: {adjacent_results}")
+        if not adjacent_results:
+            self.character_manager.log("No free position around target")
+            return character.position, 0
+        
+        # cost of the last settled neighbor (last node taken from queue)
+        min_cost_pos = list(adjacent_results.values())[-1][0]
         
         # IMPORTANT! choosing best position around target path to be processed
         min_pos = min(adjacent_results, key=lambda pos: adjacent_results[pos][0])
-        # print(f"Best: {adjacent_results}")
-        
-        # print(f"DEBUG: movepoints {move_points} cost pos {min_cost_pos}")
         
         path = {}
         
         if (move_points >= min_cost_pos) and is_Player == False:
-            print(f"DEBUG: target within reach, returning position to move: {min_pos}")
-            self.path_queue.clear()
-            self.visited.clear()
+            self.character_manager.log(f"DEBUG: target within reach, returning position to move: {min_pos}")
             sorted_path = self.sort_path(path)
             
             return min_pos, min_cost_pos
         
         if (move_points < min_cost_pos) and is_Player == False:
-            print("Checking condition for AI, target not reached")
+            self.character_manager.log("Checking condition for AI, target not reached")
             #building path back
             while min_pos is not None:
-                values = self.visited[min_pos]
-                if min_pos in self.visited:
-                    path[min_pos] = (values[0], values[1], values[2], values[3])
-                    # print(f"DEBUG: {min_pos} {values[3]}")
-                    min_pos = values[3]
+                values = visited[min_pos]
+                path[min_pos] = (values[0], values[1], values[2], values[3])
+                min_pos = values[3]
             
             closest_position = None
             closest_cost = float('-inf')  # Start with the lowest possible value
@@ -2358,10 +3108,8 @@ class EventManager:
                 if cost <= move_points and (closest_position is None or cost > closest_cost):
                     closest_position = position
                     closest_cost = cost
-            print(f"New position for AI: {closest_position}")
+            self.character_manager.log(f"New position for AI: {closest_position}")
             
-            self.path_queue.clear()
-            self.visited.clear()
             sorted_path = self.sort_path(path)
             
             return closest_position, closest_cost
@@ -2370,8 +3118,10 @@ class EventManager:
         sorted_path = sorted(path.items(), key=lambda item: item[1][0])  # item[1][0] is the cost value
         
         # print("Sorted Path from Lowest to Highest Cost:")
+        if self.character_manager.headless:
+            return
         for pos, (cost, distance, total_cost, parent) in sorted_path:
-            print(f"Position: {pos}, Cost: {cost}, Distance: {distance} Total distance: {total_cost} Parent: {parent}")
+            self.character_manager.log(f"Position: {pos}, Cost: {cost}, Distance: {distance} Total distance: {total_cost} Parent: {parent}")
         # print(f" Path found: {sorted_path}")
         
         return sorted_path
@@ -2399,10 +3149,10 @@ class EventManager:
 
         return surrounding_positions
     
-    def teams_control(self):
+    def teams_control(self, AI_one = False, AI_two = True):
         # if True then AI control
-        self.control_team_one = False
-        self.control_team_two = True
+        self.control_team_one = AI_one
+        self.control_team_two = AI_two
         
     def update_characters_info(self):
         teams = [(self.team_one, 1, self.control_team_one), (self.team_two, 2, self.control_team_two)]
@@ -2424,7 +3174,8 @@ class EventManager:
             for character in self.character_manager.characters.values():
                 if character not in self.team_one:
                     self.team_two.append(character)
-            print(f"Team one: {self.team_one} /// Team two: {self.team_two}")
+            if not self.character_manager.headless:
+                self.character_manager.log(f"Team one: {self.team_one} /// Team two: {self.team_two}")
         else:
             # AI logic to create balanced teams
             # rd.shuffle(characters)  # Shuffle characters to make the selection less predictable TODO
@@ -2443,10 +3194,10 @@ class EventManager:
                     self.team_two.append(character)
                     team_two_level += char_level
         
-        print(f"DEBUG: team one: {self.team_one} team two: {self.team_two}")
+        self.character_manager.log("DEBUG: team one:", self.team_one, "team two:", self.team_two) # lists formatted only when printed
             
     def get_team (self, character):
-        print (f"DEBUG: character in team {character.name} in {self.team_one} / {self.team_two}")
+        self.character_manager.log("DEBUG: character in team", character.name, "in", self.team_one, "/", self.team_two)
         if character in self.team_two:
             return 2
         elif character in self.team_one:
@@ -2455,12 +3206,14 @@ class EventManager:
     
     def remove_char (self, character):
         team = self.get_team(character)
-        print("remove",team)
+        self.character_manager.log("remove",team)
         if team == 2:
             self.team_two.remove(character)
         elif team == 1:
             self.team_one.remove(character)
-        else: print (f"DEBUG, remove char {character.name} from team {team}")
+        else: self.character_manager.log(f"DEBUG, remove char {character.name} from team {team}")
+        
+        self.character_manager.instance_board.remove_char(character)
     
     def next_action(self):
         os.system('cls')
@@ -2476,10 +3229,10 @@ class EventManager:
                     character = self.character_manager.get_character(character_name)
                     self.character_manager.instance_action.choose_action(character)
                 else:
-                    print("Exiting to main menu")
+                    self.character_manager.log("Exiting to main menu")
                     break
         else:
-            print("Exiting to main menu")
+            self.character_manager.log("Exiting to main menu")
             pass
             
     def start_combat(self):
@@ -2506,104 +3259,143 @@ class EventManager:
         self.character_manager.ins_pgame.initialize_screen()
         
         #start combat
-        print(f"\nCombat started.")
+        self.character_manager.log(f"\nCombat started.")
 
         self.turn()
+    
+    def start_headless_combat(self, team_one, team_two, seed = None, max_rounds = 100):
+        # AI vs AI battle without pygame, logs and delays, teams as lists of characters or names; returns (winner, rounds)
+        self.character_manager.set_headless(True)
+        
+        if seed is not None:
+            self.character_manager.rng.seed(seed)
         
-    def turn(self):
+        self.team_one = [self.character_manager.get_character(c) if isinstance(c, str) else c for c in team_one]
+        self.team_two = [self.character_manager.get_character(c) if isinstance(c, str) else c for c in team_two]
+        
+        for c in self.team_one + self.team_two:
+            c.position = set()
+            Character.re_calculate(c)
+        
+        self.character_manager.instance_board.final_board()
+        self.character_manager.roll_initiative_for_all()
+        self.character_manager.instance_board.initial_position()
+        self.teams_control(True, True)
+        self.update_characters_info()
+        
+        return self.turn(max_rounds)
+        
+    def turn(self, max_rounds = None):
         
-        no_team_one = 1
-        no_team_two = 1
         round = 1
         
+        self.winner = None
+        self.rounds = 0
+        self.damage_dealt = {}
+        
         self.reset_game()
         
-        print("turn before while")
+        self.character_manager.log("turn before while")
         
-        while no_team_one > 0 and no_team_two > 0: 
+        while True: 
             
-            print(f"\n\n>>>>>> ROUND {round} <<<<<<")
+            if max_rounds and round > max_rounds:
+                self.character_manager.log(f"Round limit {max_rounds} reached, draw!")
+                self.winner = 0
+                self.rounds = max_rounds
+                break
+            
+            self.character_manager.log(f"\n\n>>>>>> ROUND {round} <<<<<<")
             
             #reset state of reactions
             self.reactions_manage()
             
-            no_of_char = len(self.character_manager.characters)
-            self.turn_index = 0
+            winner = self.play_round()
+            if winner:
+                self.finish(winner, round)
+                break
             
-            for _ in range(no_of_char):
+            round +=1
         
-                no_team_one = len(self.team_two)
-                no_team_two = len(self.team_one)
-
-                if no_team_one==0:
-                    print ("Team one, you won the battle!")
-                    self.character_manager.instance_action.screen = None
-                    pygame.quit()
-                    
-                    for char in self.team_one:
-                        char.wins += 1
-                        char.games += 1
-                    
-                    for char in self.team_two:
-                        char.defeats += 1
-                        char.games += 1
-                    
-                    break
-                
-                elif no_team_two==0:
-                    print ("Team two, you won the battle!")
-                    self.character_manager.instance_action.screen = None
-                    pygame.quit()
-                    
-                    for char in self.team_two:
-                        char.wins += 1
-                        char.games += 1
-                
-                    for char in self.team_one:
-                        char.defeats += 1
-                        char.games += 1
-                    
-                    break
-                
-                character_name,_ = self.character_manager.initiative_order[self.turn_index]
-                current_character = self.character_manager.get_character(character_name)
-                print(f"DEBUG: current char: {character_name}")
-                status = current_character.instance_hp.check_status(0,0)
-                if status == -1:
-                    self.character_manager.instance_event_manager.remove_char(current_character)
-                    print (f"Removing current character {current_character.name} in turn function")
-                
-                if status in [-1,0,2]:
-                    self.turn_index += 1
-                    continue
-                
-                self.char = current_character
+        self.character_manager.close()
+        return self.winner, self.rounds
+    
+    def check_winner(self):
+        # 1 / 2 if other team has no characters left, None if battle goes on
+        if not self.team_two:
+            return 1
+        elif not self.team_one:
+            return 2
+        return None
+    
+    def finish(self, winner, round):
+        self.character_manager.log(f"Team {'one' if winner == 1 else 'two'}, you won the battle!")
+        self.character_manager.instance_action.screen = None
+        self.character_manager.ins_pgame.quit()
+        self.winner = winner
+        self.rounds = round
+        
+        winners, losers = (self.team_one, self.team_two) if winner == 1 else (self.team_two, self.team_one)
+        for char in winners:
+            char.wins += 1
+            char.games += 1
+        
+        for char in losers:
+            char.defeats += 1
+            char.games += 1
+    
+    def play_round(self, start = 0, ai_only = False):
+        # turns of characters in initiative order from start index, returns winning team as soon as one team is gone (None otherwise)
+        # ai_only - player controlled characters are played by AI too (planner rollouts)
+        for self.turn_index in range(start, len(self.character_manager.initiative_order)):
+            
+            # checking before next turn if there is any enemy/player left
+            winner = self.check_winner()
+            if winner:
+                return winner
+            
+            character_name,_ = self.character_manager.initiative_order[self.turn_index]
+            current_character = self.character_manager.get_character(character_name)
+            self.character_manager.log(f"DEBUG: current char: {character_name}")
+            status = current_character.instance_hp.check_status(0,0)
+            if status == -1:
+                # check_status already removed character from its team and board
+                self.character_manager.log(f"Current character {current_character.name} died in turn function")
+            
+            if status in [-1,0,2]:
+                continue
+            
+            self.char = current_character
 
-                #refresh pygame window
-                self.character_manager.ins_pgame.main_loop()
-                
-                if current_character in self.team_one:
-                    if self.control_team_one:
-                        self.character_manager.instance_AI.AI_turn(current_character)
-                    else:
-                        self.character_manager.instance_player.player_turn(current_character)
-                elif current_character in self.team_two:
-                    if self.control_team_two:
-                        self.character_manager.instance_AI.AI_turn(current_character)
-                    else:
-                        self.character_manager.instance_player.player_turn(current_character)
-                        
-                self.turn_index += 1
-                
-                # checking before next turn if there is any enemy/player left   
-            round +=1
+            #refresh pygame window
+            self.character_manager.ins_pgame.main_loop()
+            
+            if current_character in self.team_one:
+                if self.control_team_one or ai_only:
+                    self.character_manager.instance_AI.AI_turn(current_character)
+                else:
+                    self.character_manager.instance_player.player_turn(current_character)
+            elif current_character in self.team_two:
+                if self.control_team_two or ai_only:
+                    self.character_manager.instance_AI.AI_turn(current_character)
+                else:
+                    self.character_manager.instance_player.player_turn(current_character)
+        
+        return None
 
 class Board:
+    # terrain codes, index in board_signs
+    GRASS = 0
+    FOREST = 1
+    HILL = 2
+    
     def __init__ (self, character_manager):
         self.character_manager = character_manager
         
-        self.i_board = []
-        self.p_board = []
+        self.terrain = None # uint8 array [y, x] with terrain codes
+        self.occupancy = None # int32 array [y, x], 0 - free, otherwise id of character
+        self.char_ids = {} # character: id
+        self.occupants = {} # id: character
         
         self.center_x = None
         self.center_y = None
@@ -2612,12 +3404,55 @@ class Board:
         self.board_signs = []
         
         self.used_positions = set()
+        
+        self.version = 0 # increased on every change of occupancy/terrain, used for caching paths
+        self.terrain_version = 0 # increased only on change of terrain, used for caching lines of sight
+        self.grid = None
+        self.grid_version = None
+    
+    @property
+    def i_board (self):
+        # text view of terrain, for printing only
+        if self.terrain is None:
+            return []
+        return [[self.board_signs[t] for t in row] for row in self.terrain.tolist()]
+    
+    @property
+    def p_board (self):
+        # text view of terrain with characters (two first letters of name), for printing only
+        board = self.i_board
+        for y, x in zip(*np.nonzero(self.occupancy)):
+            occupant = self.occupants.get(int(self.occupancy[y, x]))
+            board[y][x] = occupant.name[:2] if occupant else "##"
+        return board
+    
+    def cost_grid (self):
+        # move cost multiplier for every position as list of lists, 0 - occupied, 1 - normal, 2 - hills, rebuilt when board version changes
+        # pathfinding reads single cells in tight loops, grid[y][x] on lists is ~3x faster than indexing numpy array and faster than flat list with y * size + x
+        if self.grid_version != self.version:
+            grid = np.where(self.terrain == self.HILL, 2, 1)
+            grid[self.occupancy != 0] = 0
+            self.grid = grid.tolist()
+            self.grid_version = self.version
+        return self.grid
+    
+    def get_char_id (self, character):
+        if character not in self.char_ids:
+            char_id = len(self.char_ids) + 1
+            self.char_ids[character] = char_id
+            self.occupants[char_id] = character
+        return self.char_ids[character]
     
     def create_blank_board (self):
         # generate board, in future add a method for picking betweens different setups
-        self.i_board = [[self.board_signs[0] for _ in range(self.size)] for _ in range(self.size)]
+        self.terrain = np.full((self.size, self.size), self.GRASS, dtype=np.uint8)
+        self.occupancy = np.zeros((self.size, self.size), dtype=np.int32)
+        self.char_ids = {}
+        self.occupants = {}
+        self.character_manager.positions.clear()
         self.center_x, self.center_y = self.size // 2, self.size // 2
         self.tiles = self.size**2
+        self.terrain_version += 1
     
     def generate_terrain(self, tile_no1_perc, tile_no2_perc):
         tile_no1 = int(self.tiles * tile_no1_perc)
@@ -2629,22 +3464,29 @@ class Board:
         if avoid_positions is None:
             avoid_positions = set()
 
+        dice = self.character_manager.rng
+        size = self.size
+        terrain = self.terrain.tolist() # random walk on plain lists, numpy element access is slow, written back at the end
+        
         positions = set()
         positions.add((self.center_x, self.center_y))
-        self.i_board[self.center_y][self.center_x] = symbol
+        tiles = [(self.center_x, self.center_y)] # same as positions, for random choice without building list every step
+        terrain[self.center_y][self.center_x] = symbol
 
         while len(positions) < num_tiles:
-            x, y = rd.choice(list(positions))
-            # random direction
+            x, y = dice.choice(tiles)
+            # random direction, one of valid ones (same as shuffling directions and taking first valid)
             directions = [(-1, 0), (1, 0), (0, -1), (0, 1), (-1, -1), (1, 1), (-1, 1), (1, -1)]
-            rd.shuffle(directions)
-            for dx, dy in directions:
-                nx, ny = x + dx, y + dy
-                if (0 <= nx < self.size and 0 <= ny < self.size):
-                    if self.i_board[nx][ny] != " /\\":
-                        self.i_board[ny][nx] = symbol
-                        positions.add((nx, ny))
-                        break
+            valid = [(x + dx, y + dy) for dx, dy in directions if 0 <= x + dx < size and 0 <= y + dy < size and terrain[x + dx][y + dy] != self.HILL]
+            if valid:
+                nx, ny = dice.choice(valid)
+                terrain[ny][nx] = symbol
+                if (nx, ny) not in positions:
+                    positions.add((nx, ny))
+                    tiles.append((nx, ny))
+        
+        self.terrain[:] = terrain
+        self.terrain_version += 1
     
     def final_board (self):
         # main function
@@ -2658,21 +3500,22 @@ class Board:
         tile_no2_perc = 0.1
         first_tiles, second_tiles = self.generate_terrain(tile_no1_perc, tile_no2_perc)
         
-        self.board = self.generate_area(self.board_signs[1], first_tiles)
-        self.board = self.generate_area(self.board_signs[2], second_tiles, self.board_signs[1])
+        self.board = self.generate_area(self.FOREST, first_tiles)
+        self.board = self.generate_area(self.HILL, second_tiles, self.FOREST)
         
-        for row in self.i_board:
-            print("".join(row))
+        if not self.character_manager.headless: # text board is built only for printing
+            for row in self.i_board:
+                self.character_manager.log("".join(row))
         
-        self.p_board = [row[:] for row in self.i_board]
+        self.version += 1
     
     def get_rd_position (self,center):
         # Generate a rd position around the center within a range of -1 to 1
         x, y = center
 
         while True:
-            new_x = x + rd.choice([-1, 0, 1])
-            new_y = y + rd.choice([-1, 0, 1])
+            new_x = x + self.character_manager.rng.randint(-1, 1)
+            new_y = y + self.character_manager.rng.randint(-1, 1)
             position = (new_x, new_y)
             if position not in self.used_positions and 0 <= new_x < self.size and 0 <= new_y < self.size:
                 self.used_positions.add(position)
@@ -2681,46 +3524,57 @@ class Board:
     def initial_position(self):
         
         # Generate rd central points for both teams
-        team_one_center = (rd.randint(2, self.size - 3), rd.randint(self.size - 6, self.size - 2))
-        team_two_center = (rd.randint(2, self.size - 3), rd.randint(1, 5))
+        dice = self.character_manager.rng
+        team_one_center = (dice.randint(2, self.size - 3), dice.randint(self.size - 6, self.size - 2))
+        team_two_center = (dice.randint(2, self.size - 3), dice.randint(1, 5))
         
         self.used_positions = set()  # To ensure no overlapping positions
 
         for char in self.character_manager.instance_event_manager.team_two:
-            print(f"DEBUG: team two {self.character_manager.instance_event_manager.team_two}")
+            self.character_manager.log("DEBUG: team two", self.character_manager.instance_event_manager.team_two)
         for char in self.character_manager.instance_event_manager.team_one:
-            print(f"DEBUG: team one {self.character_manager.instance_event_manager.team_one}")
+            self.character_manager.log("DEBUG: team one", self.character_manager.instance_event_manager.team_one)
         
         # Assign rd clustered positions for team two
         for char in self.character_manager.instance_event_manager.team_two:
-            print(f"DEBUG: char object: {char.name}")
+            self.character_manager.log(f"DEBUG: char object: {char.name}")
             position = self.get_rd_position(team_two_center)
             char.position = position
             self.update_player_position(char, position)
 
         # Assign rd clustered positions for team one
         for char in self.character_manager.instance_event_manager.team_one:
-            print(f"DEBUG: char object: {char.name}")
+            self.character_manager.log(f"DEBUG: char object: {char.name}")
             position = self.get_rd_position(team_one_center)
             char.position = position
             self.update_player_position(char, position)
     
     def update_player_position(self, character, new_position):
         # main function for updating char position - within board and in Character instance
-        print(f"{character.name} move from {character.position} to {new_position}")
+        self.character_manager.log(f"{character.name} move from {character.position} to {new_position}")
         if character.position != new_position:
             txt = txt = f"{character.name} moves from {character.position} to {new_position}"
             self.character_manager.ins_pgame.add_log (txt)
         
+        # occupancy grid and position index (BattleContext.positions) are updated together
+        positions = self.character_manager.positions
+        char_id = self.get_char_id(character)
+        new_position = tuple(new_position)
+        
         #return old position state to original state
         old_position = character.position
         if old_position:
             old_x, old_y = old_position
-            self.p_board[old_y][old_x] = self.i_board[old_y][old_x]
+            if self.occupancy[old_y, old_x] == char_id:
+                self.occupancy[old_y, old_x] = 0
+            if positions.get(old_position) is character:
+                del positions[old_position]
         
         new_x, new_y = new_position
-        self.p_board[new_y][new_x] = character.name[:2]
+        self.occupancy[new_y, new_x] = char_id
+        positions[new_position] = character
         character.position = new_position
+        self.version += 1
         
         # print("Current board state:")
         # for row in self.p_board:
@@ -2734,9 +3588,21 @@ class Board:
             self.character_manager.ins_pgame.update_pygame(character)
         except:
             pass
+    
+    def remove_char(self, character):
+        # free position of character that is removed from battle (dead)
+        positions = self.character_manager.positions
+        position = character.position
+        
+        if position and positions.get(position) is character:
+            x, y = position
+            del positions[position]
+            self.occupancy[y, x] = 0
+            self.version += 1
         
     def check_surrounding_occupied(self, pos):
         x, y = pos
+        grid = self.cost_grid()
 
         surrounding_positions = []
 
@@ -2749,97 +3615,474 @@ class Board:
         for dx, dy in moves:
             new_x, new_y = x + dx, y + dy
 
-            # TODO if len==1 then free, assume that char has min. 2 letter
             if 0 <= new_x < self.size and 0 <= new_y < self.size:
-                if self.p_board[new_y][new_x] in self.board_signs:
+                if grid[new_y][new_x]:
                     surrounding_positions.append((new_x, new_y))
 
         return surrounding_positions
 
+class Snapshot:
+    # battle state made by BattleState.save, values are kept in flat read only arrays (one row per character)
+    def __init__ (self, characters, positions, placed, values, teams, turn, damage_dealt, version):
+        self.characters = characters # list, row order of arrays
+        self.positions = positions # int32 [n, 2], -1 - not placed yet
+        self.placed = placed # bool [n], character stands on board (dead are removed)
+        self.values = values # float64 [n, len(BattleState.fields)], nan - None
+        self.teams = teams # (team one, team two)
+        self.turn = turn # (turn_index, char)
+        self.damage_dealt = damage_dealt
+        self.version = version # board version at save
+        
+        for array in (positions, placed, values):
+            array.flags.writeable = False
+
+class BattleState:
+    # save / restore of everything that changes during battle, O(characters) both ways
+    # board occupancy is not copied - it is rebuilt from positions, only tiles of characters are written
+    # one snapshot can be restored any number of times (planners, undo)
+    fields = ("current_hp", "status", "death_throw_count_plus", "death_throw_count_minus",
+              "c_actions", "c_move_points", "c_attacks", "c_reactions", "c_bonus_actions",
+              "c_no_cleave", "c_no_nick", "c_second_winds")
+    
+    def __init__ (self, character_manager):
+        self.character_manager = character_manager
+    
+    def row(self, c):
+        # same order as fields
+        hp = c.instance_hp
+        features = c.instance_features
+        return (hp.current_hp, hp.status, hp.death_throw_count_plus, hp.death_throw_count_minus,
+                c.c_actions, c.c_move_points, c.c_attacks, c.c_reactions, c.c_bonus_actions,
+                features.c_no_cleave, features.c_no_nick, c.instance_fighter.c_second_winds)
+    
+    def save(self):
+        character_manager = self.character_manager
+        em = character_manager.instance_event_manager
+        positions = character_manager.positions
+        
+        characters = list(character_manager.characters.values())
+        coords = np.array([c.position if c.position else (-1, -1) for c in characters], dtype=np.int32).reshape(-1, 2)
+        placed = np.array([bool(c.position) and positions.get(c.position) is c for c in characters], dtype=bool)
+        values = np.array([self.row(c) for c in characters], dtype=np.float64).reshape(-1, len(self.fields))
+        
+        return Snapshot(characters, coords, placed, values, (list(em.team_one), list(em.team_two)),
+                        (em.turn_index, em.char), dict(em.damage_dealt), character_manager.instance_board.version)
+    
+    def restore(self, snapshot):
+        character_manager = self.character_manager
+        em = character_manager.instance_event_manager
+        board = character_manager.instance_board
+        positions = character_manager.positions
+        occupancy = board.occupancy
+        
+        # take characters off the board, then put them back on saved positions
+        for c in snapshot.characters:
+            if c.position and positions.get(c.position) is c:
+                x, y = c.position
+                del positions[c.position]
+                occupancy[y, x] = 0
+        
+        for c, (x, y), placed, values in zip(snapshot.characters, snapshot.positions.tolist(), snapshot.placed.tolist(), snapshot.values.tolist()):
+            c.position = (x, y) if x >= 0 else set()
+            if placed:
+                positions[c.position] = c
+                occupancy[y, x] = board.get_char_id(c)
+            
+            # nan back to None, whole numbers back to int
+            (hp, status, plus, minus, c.c_actions, c.c_move_points, c.c_attacks, c.c_reactions, c.c_bonus_actions,
+             no_cleave, no_nick, second_winds) = [None if v != v else int(v) if v.is_integer() else v for v in values]
+            c.instance_hp.current_hp, c.instance_hp.status = hp, status
+            c.instance_hp.death_throw_count_plus, c.instance_hp.death_throw_count_minus = plus, minus
+            c.instance_features.c_no_cleave, c.instance_features.c_no_nick = no_cleave, no_nick
+            c.instance_fighter.c_second_winds = second_winds
+        
+        em.team_one[:], em.team_two[:] = snapshot.teams
+        em.turn_index, em.char = snapshot.turn
+        em.damage_dealt = dict(snapshot.damage_dealt)
+        board.version = max(board.version, snapshot.version) + 1 # never reuse old version, caches keyed by version would be stale
+
+class PathFinder:
+    # A* engine shared by EventManager and Algorithms, open set kept on a binary heap
+    def __init__ (self, character_manager):
+        self.character_manager = character_manager
+        
+        self.moves = [
+            (-1, -1), (0, -1), (1, -1),
+            (-1, 0),          (1, 0),
+            (-1, 1),  (0, 1),  (1, 1) 
+        ]
+        
+        self.expanded = 0 # number of nodes taken from queue, used by benchmark
+    
+    def search (self, start, target_pos, goals=None):
+        # A* from start towards target_pos, with closed set and lazy decrease-key (old heap entries are skipped when popped)
+        # goals None - stop when target_pos is reached, otherwise stop when all goals are reached
+        # returns (settled goals, closed nodes), both {pos: (cost, distance, total, parent)}, settled in order of reaching them
+        board = self.character_manager.instance_board
+        grid = board.cost_grid()
+        size = board.size
+        
+        tx, ty = target_pos
+        goals = {tuple(target_pos)} if goals is None else set(goals)
+        settled = {}
+        
+        d = sqrt((tx - start[0])**2 + (ty - start[1])**2) * 5
+        closed = {start: (0, d, d, None)}
+        
+        if start in goals:
+            settled[start] = closed[start]
+        if len(settled) == len(goals):
+            return settled, closed
+        
+        # ties on total cost are broken by order of first insertion, same as scanning dict of open nodes
+        queued = {}
+        heap = []
+        order = count()
+        
+        node = start
+        cost_old = 0
+        
+        while True:
+            x, y = node
+            for dx, dy in self.moves:
+                new_x, new_y = x + dx, y + dy
+                pos = (new_x, new_y)
+                
+                if 0 <= new_x < size and 0 <= new_y < size and pos not in closed and grid[new_y][new_x]:
+                    # hills cost x2
+                    cost = (5 if dx == 0 or dy == 0 else 7.5) * grid[new_y][new_x] + cost_old
+                    d = sqrt((tx - new_x)**2 + (ty - new_y)**2) * 5
+                    total = d + cost
+                    
+                    old = queued.get(pos)
+                    if old is None:
+                        seq = next(order)
+                    elif total < old[2]:
+                        seq = old[4]
+                    else:
+                        continue
+                    
+                    queued[pos] = (cost, d, total, node, seq)
+                    heappush(heap, (total, seq, pos))
+            
+            # take cheapest node, skipping entries that were already closed
+            while heap:
+                node = heappop(heap)[2]
+                if node not in closed:
+                    break
+            else:
+                return settled, closed
+            
+            values = queued.pop(node)[:4]
+            closed[node] = values
+            cost_old = values[0]
+            self.expanded += 1
+            
+            if node in goals:
+                settled[node] = values
+                if len(settled) == len(goals):
+                    return settled, closed
+    
+    def flood (self, start):
+        # Dijkstra from start, same move cost rules as search (diagonal 7.5, hills x2), expanded lazily by CostField queries
+        return CostField(self.character_manager.instance_board, start, self.moves)
+
+class CostField:
+    # movement cost field, cheapest cost from origin to every reachable position
+    # nodes are settled in cost order only as far as queries need, so first settled position around target is the cheapest one
+    def __init__ (self, board, origin, moves):
+        self.board = board
+        self.grid = board.cost_grid()
+        self.moves = moves
+        self.origin = origin
+        
+        self.costs = {origin: 0} # best known cost
+        self.settled = {} # final cost
+        self.heap = [(0, origin)]
+    
+    def expand (self, targets = None):
+        # settle nodes until one of targets is settled (returns it) or whole board is done (returns None)
+        grid = self.grid
+        size = self.board.size
+        costs = self.costs
+        settled = self.settled
+        heap = self.heap
+        
+        while heap:
+            cost_old, node = heappop(heap)
+            if node in settled:
+                continue
+            settled[node] = cost_old
+            
+            x, y = node
+            for dx, dy in self.moves:
+                new_x, new_y = x + dx, y + dy
+                pos = (new_x, new_y)
+                
+                if 0 <= new_x < size and 0 <= new_y < size and grid[new_y][new_x] and pos not in settled:
+                    cost = (5 if dx == 0 or dy == 0 else 7.5) * grid[new_y][new_x] + cost_old
+                    
+                    if cost < costs.get(pos, float('inf')):
+                        costs[pos] = cost
+                        heappush(heap, (cost, pos))
+            
+            if targets and node in targets:
+                return node
+        return None
+    
+    def ring_cost (self, pos):
+        # cheapest cost to any free position around pos, same as Algorithms.check_target_cost
+        ring = self.board.check_surrounding_occupied(pos)
+        known = [self.settled[n] for n in ring if n in self.settled]
+        if known:
+            return min(known)
+        
+        found = self.expand(set(ring))
+        return self.settled[found] if found else float('inf')
+
+class LineOfSight:
+    # cover of ranged targets, squares of every line and forest along it are cached per shooter position until terrain changes,
+    # characters standing in the way are read from occupancy grid on every call
+    def __init__ (self, character_manager):
+        self.character_manager = character_manager
+        
+        self.fields = {} # {origin: {target position: (ys, xs, forest)}}
+        self.terrain_version = None
+    
+    def line (self, origin, target):
+        board = self.character_manager.instance_board
+        if board.terrain_version != self.terrain_version:
+            self.fields.clear()
+            self.terrain_version = board.terrain_version
+        
+        field = self.fields.setdefault(origin, {})
+        line = field.get(target)
+        if line is None:
+            path = self.character_manager.instance_algorithms.calc_pts_alongtheway(origin, target)
+            ys = np.array([y for _, y in path], dtype=np.intp)
+            xs = np.array([x for x, _ in path], dtype=np.intp)
+            line = field[target] = (ys, xs, board.terrain[ys, xs] == Board.FOREST)
+        return line
+    
+    def obstruction (self, origin, targets):
+        # part of every line (0-1) that is blocked, character counts 1 and free forest square 0.5; nan for adjacent target (no squares between)
+        occupancy = self.character_manager.instance_board.occupancy
+        lines = [self.line(origin, tuple(target)) for target in targets]
+        lengths = np.array([len(ys) for ys, _, _ in lines])
+        
+        if not lengths.sum():
+            return np.full(len(lines), np.nan)
+        
+        # all lines at once: one gather from occupancy, sum per line from cumulative sum
+        ys = np.concatenate([ys for ys, _, _ in lines])
+        xs = np.concatenate([xs for _, xs, _ in lines])
+        forest = np.concatenate([forest for _, _, forest in lines])
+        occupied = occupancy[ys, xs] != 0
+        blocked = np.concatenate(([0], np.cumsum(occupied + 0.5 * (forest & ~occupied))))
+        
+        ends = np.cumsum(lengths)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return (blocked[ends] - blocked[ends - lengths]) / lengths
+    
+    def cover_scores (self, origin, targets):
+        # AI reward for every target, less obstructed line - higher score, 10 - adjacent (possible attack of opportunity)
+        perc = self.obstruction(origin, targets)
+        # TODO disadvantage, +5 AC to target / +5 AC to target / +2 AC to target
+        return np.select([np.isnan(perc), perc > 0.5, perc > 0.3, perc > 0.1], [10, 15, 30, 50], 100)
+
+class FieldOfView:
+    # squares that character can see, recursive shadowcasting over 8 octants of board
+    # sight starts at 1 and every square passed on the way takes part of it: forest 0.5, character 1 (same weights as LineOfSight),
+    # so square behind one forest is seen at 0.5 and behind two forests / character is hidden
+    # results (float arrays [y, x], 0 - not visible) are cached until board version changes
+    octants = [(1, 0, 0, 1), (0, 1, 1, 0), (0, -1, 1, 0), (-1, 0, 0, 1),
+               (-1, 0, 0, -1), (0, -1, -1, 0), (0, 1, -1, 0), (1, 0, 0, -1)]
+    
+    def __init__ (self, character_manager):
+        self.character_manager = character_manager
+        
+        self.fields = {} # {(origin, radius): sight array}
+        self.views = {} # {(positions, radius): sight array} of whole teams
+        self.grid = None # obstruction of every square as list of lists
+        self.version = None
+    
+    def check_version (self):
+        board = self.character_manager.instance_board
+        if board.version != self.version:
+            self.fields.clear()
+            self.views.clear()
+            obstruction = np.where(board.terrain == Board.FOREST, 0.5, 0.0)
+            obstruction[board.occupancy != 0] = 1.0
+            self.grid = obstruction.tolist()
+            self.version = board.version
+    
+    def field (self, origin, radius = None):
+        # sight of every square from origin, radius in squares (None - whole board)
+        self.check_version()
+        key = (tuple(origin), radius)
+        sight = self.fields.get(key)
+        
+        if sight is None:
+            board = self.character_manager.instance_board
+            sight = [[0.0] * board.size for _ in range(board.size)] # plain lists while casting, numpy element access is slow
+            x, y = origin
+            sight[y][x] = 1.0
+            for octant in self.octants:
+                self.cast(sight, x, y, 1, 1.0, 0.0, 1.0, radius if radius is not None else 2 * board.size, octant)
+            sight = np.array(sight)
+            sight.flags.writeable = False
+            self.fields[key] = sight
+        return sight
+    
+    def cast (self, sight, cx, cy, row, start, end, power, radius, octant):
+        # one row of octant between slopes start > end, squares in range are lit with power and split into runs of same obstruction,
+        # light goes behind every run with power reduced by its obstruction
+        if start < end or row > radius:
+            return
+        xx, xy, yx, yy = octant
+        grid = self.grid
+        size = len(grid)
+        
+        runs = [] # [obstruction, first square left slope, last square right slope]
+        dy = -row
+        for dx in range(-row, 1):
+            l_slope = (dx - 0.5) / (dy + 0.5)
+            r_slope = (dx + 0.5) / (dy - 0.5)
+            if start < r_slope:
+                continue
+            if end > l_slope:
+                break
+            
+            X = cx + dx * xx + dy * xy
+            Y = cy + dx * yx + dy * yy
+            if 0 <= X < size and 0 <= Y < size:
+                if dx * dx + dy * dy <= radius * radius and sight[Y][X] < power:
+                    sight[Y][X] = power
+                obstruction = grid[Y][X]
+            else:
+                obstruction = 1.0
+            
+            if runs and runs[-1][0] == obstruction:
+                runs[-1][2] = r_slope
+            else:
+                runs.append([obstruction, l_slope, r_slope])
+        
+        # borders between runs are moved towards more obstructed run (lighter side sees up to corner of darker square)
+        for i, (obstruction, l_slope, r_slope) in enumerate(runs):
+            if power - obstruction <= 0:
+                continue
+            run_start = start if i == 0 else (l_slope if obstruction > runs[i-1][0] else runs[i-1][2])
+            run_end = end if i == len(runs) - 1 else (runs[i+1][1] if runs[i+1][0] > obstruction else r_slope)
+            self.cast(sight, cx, cy, row + 1, min(run_start, start), max(run_end, end), power - obstruction, radius, octant)
+    
+    def team_view (self, team, radius = None):
+        # squares seen by any member of team (highest sight of all members)
+        self.check_version()
+        positions = tuple(tuple(c.position) for c in team if c.position)
+        key = (positions, radius)
+        view = self.views.get(key)
+        
+        if view is None:
+            board = self.character_manager.instance_board
+            fields = [self.field(position, radius) for position in positions]
+            view = np.maximum.reduce(fields) if fields else np.zeros((board.size, board.size))
+            self.views[key] = view
+        return view
+    
+    def sees (self, c, t, radius = None):
+        x, y = t.position
+        return self.field(c.position, radius)[y, x] > 0
+
 class Algorithms():
     def __init__ (self, character_manager):
         self.character_manager = character_manager
         
-        self.path_queue = {}
-        self.visited = {}    
+        # path results {(start, target, board version): result}, only current board version is kept
+        self.path_cache = {}
+        self.cache_version = None
+        self.cache_hits = 0
+        self.cache_misses = 0
+    
+    def cache_key (self, start, target):
+        version = self.character_manager.instance_board.version
+        if version != self.cache_version:
+            self.path_cache.clear()
+            self.cache_version = version
+        return (start, target, version)
+    
+    def cache_info (self):
+        return {"hits": self.cache_hits, "misses": self.cache_misses, "size": len(self.path_cache), "version": self.cache_version}
+    
+    def cost_field (self, c):
+        # flood once from character position, reused until board changes
+        key = self.cache_key(c.position, None)
+        field = self.path_cache.get(key)
+        
+        if field is None:
+            self.cache_misses += 1
+            field = self.character_manager.instance_pathfinder.flood(c.position)
+            self.path_cache[key] = field
+        else:
+            self.cache_hits += 1
+        return field
     
     def is_char (self, pos):
-        for obj in self.character_manager.characters.values():
-            if obj.position == pos:
-                return True
-        return False
+        return pos in self.character_manager.positions
     
     def is_enemy (self, char, pos):
         
         opposing_team = (self.character_manager.instance_event_manager.team_two if char.team == 1 else self.character_manager.instance_event_manager.team_one)
         
-        for obj in opposing_team:
-            if obj.position == pos:
-                return True
-        return False
+        obj = self.character_manager.positions.get(pos)
+        return obj is not None and obj in opposing_team
     
     def get_char_from_pos (self, pos):
-        for c in self.character_manager.characters.values():
-            if c.position == pos:
-                return c
+        return self.character_manager.positions.get(pos)
     
     def calc_pts_alongtheway (self, pos_start, pos_end):
         # returns squares that are intersected by line from start to end pos (straight ranged attack line)
+        # grid traversal (Amanatides-Woo) from centre of start square, square counts when line runs inside it for at least min_overlap
         x1,y1 = pos_start
         x2,y2 = pos_end
-        grid_size = 1
         min_overlap=0.1
         
-        path = set()
-        line = LineString([(x1 + 0.5, y1 + 0.5), (x2 + 0.5, y2 + 0.5)])
-
-        for x in range(min(x1, x2), max(x1, x2) + 1):
-            for y in range(min(y1, y2), max(y1, y2) + 1):
-                cell = box(x, y, x + grid_size, y + grid_size)
-                intersection = line.intersection(cell)
-
-                if not intersection.is_empty and line.intersection(cell).length >= min_overlap:
-                    path.add((x, y))
-        path = [pos for pos in path if pos not in (pos_start, pos_end)]
-        return list(path)
-    
-    def check_path_to_target (self, pos_start, pos_end):
-        #iterate through the path and check conditions along the way, if it is obstructed then return diff level (for AI purposes)
-        path = self.calc_pts_alongtheway (pos_start, pos_end)
-        diff = 0
-        path_len = len(path)
-        dict = {}
-        
-        # check for any char in the way
-        for char in self.character_manager.characters.values():
-            if char.position in path:
-                diff += 1
-        
-        # check for any map obstacle in the way (tree in v1.0)
-        for pos in path:
-            if self.character_manager.instance_board.p_board[pos[0]][pos[1]] in self.character_manager.instance_board.board_signs[1]:
-                diff += 0.5
-        try:
-            perc = diff / path_len
-        except:
-            print ("Possible attack of opportunity")
-            return 10
-        
-        # AI LOGIC REWARD
-        if perc > 0.5:
-            # TODO disadvantage, +5 AC to target
-            return 15
-        elif perc> 0.3:
-            # TODO +5 AC to target
-            return 30
-        elif perc> 0.1:
-            # TODO +2 AC to target
-            return 50
-        else: return 100
+        dx, dy = x2 - x1, y2 - y1
+        length = sqrt(dx**2 + dy**2)
+        path = []
+        if length == 0:
+            return path
+        
+        step_x = 1 if dx > 0 else -1
+        step_y = 1 if dy > 0 else -1
+        # part of line (0-1) needed to cross one square horizontally / vertically, first border is half square away from centre
+        delta_x = 1 / abs(dx) if dx else float("inf")
+        delta_y = 1 / abs(dy) if dy else float("inf")
+        
+        x, y = x1, y1
+        cross_x = cross_y = 0 # borders crossed
+        t = 0
+        while True:
+            next_x = (cross_x + 0.5) * delta_x
+            next_y = (cross_y + 0.5) * delta_y
+            t_exit = min(next_x, next_y, 1)
+            
+            if (t_exit - t) * length >= min_overlap and (x, y) != pos_start and (x, y) != pos_end:
+                path.append((x, y))
+            if t_exit >= 1:
+                return path
+            
+            # through corner both coordinates change, squares touching only the corner have no overlap
+            if next_x <= next_y:
+                x += step_x
+                cross_x += 1
+            if next_y <= next_x:
+                y += step_y
+                cross_y += 1
+            t = t_exit
     
     def is_adjacent_reach (self, c, t):
-        print(c)
-        reach = c.instance_equipment.first_weapon["reach"]
+        self.character_manager.log(c)
+        reach = c.instance_equipment.first_weapon.reach
         c_pos = c.position
         t_pos = t.position
         if reach ==5:
@@ -2847,7 +4090,7 @@ class Algorithms():
         elif reach == 10:
             return self.is_adjacent_10 (c_pos, t_pos)
         else:
-            print("Out of reach or ranged")
+            self.character_manager.log("Out of reach or ranged")
             return False
     
     def is_adjacent (self, pos, target):
@@ -2882,130 +4125,51 @@ class Algorithms():
             cost = 7.5
 
         # check if new pos is hill, if is cost x2
-        if self.character_manager.instance_board.i_board[y2][x2] == self.character_manager.instance_board.board_signs[2]:
+        if self.character_manager.instance_board.terrain[y2, x2] == Board.HILL:
             cost *=2
             
         return cost
     
-    def calc_path(self, old_pos, tar_pos, cost_old):
-        # print(f"DEBUG Checking {old_pos}:")
-        x, y = old_pos
-        surround = {}
-        
-        moves = [
-            (-1, -1), (0, -1), (1, -1),
-            (-1, 0),          (1, 0),
-            (-1, 1),  (0, 1),  (1, 1) 
-        ]
-        
-        for dx, dy in moves:
-            new_x, new_y = x + dx, y + dy
-            pos = new_x, new_y
-
-            # Sprawdzenie, czy nowe współrzędne są w granicach planszy i nie były wcześniej odwiedzone
-            if 0 <= new_x < len(self.character_manager.instance_board.p_board[0]) and 0 <= new_y < self.character_manager.instance_board.size and pos not in self.visited:
-                # Sprawdzenie, czy pole jest oznaczone jako "E"
-                if self.character_manager.instance_board.p_board[new_y][new_x] in self.character_manager.instance_board.board_signs:
-                    d = self.distance([new_x, new_y], tar_pos)
-                    cost = self.move_cost([new_x, new_y], [x, y]) + cost_old
-                    total = d + cost
-                    surround[(new_x, new_y)] = (cost, d, total, old_pos)
-        
-        #print(f"DEBUG: calc_path, {surround} \n\n")
-        return surround
-
     def get_adjacent_path (self, character, target_pos, target_neighbors):
-        
-        adjacent_results = {}
-        min_pos = None
-        
-        while True:
-            min_cost = float('inf')
-            
-            # first node, if no items in queue
-            if not self.path_queue:
-                self.path_queue = self.calc_path(character.position, target_pos, 0)
-            
-            # iterate through queue and find optimal path (min_pos) for the cost (min_cost_pos)
-            for position, values in self.path_queue.items():
-                cost, distance, total_cost, parent = values
-                if total_cost < min_cost:
-                    min_pos = position
-                    min_cost_pos = cost
-                    min_distance = distance
-                    min_cost = total_cost
-                    min_parent = parent
-            
-            # checking if founded position is in neighbors, if True, removing neighbors from the list
-            if min_pos in target_neighbors:
-                adjacent_results[min_pos] = self.path_queue[min_pos]
-                target_neighbors.remove(min_pos)
-        
-            if not target_neighbors:
-                self.visited[min_pos] = (min_cost_pos, min_distance, min_cost, min_parent)
-                return adjacent_results
-            
-            #removing to be checked node from queue
-            self.path_queue.pop(min_pos, None)
-            
-            # adding to be checked node to visited dict
-            self.visited[min_pos] = (min_cost_pos, min_distance, min_cost, min_parent)
-            
-            #calculating position around new position
-            new_positions = self.calc_path(min_pos, target_pos, min_cost_pos)
-
-            # adding new node to be checked if cost is lower
-            for pos, vals in new_positions.items():
-                if pos not in self.path_queue or vals[2] < self.path_queue[pos][2]:
-                    self.path_queue[pos] = vals
+        # settle all positions from target_neighbors, returns {pos: (cost, distance, total, parent)}
+        adjacent_results, _ = self.character_manager.instance_pathfinder.search(character.position, target_pos, target_neighbors)
+        return adjacent_results
     
     def check_target_cost (self, character, target_pos):
         
-        #clearing path / initialize
-        self.path_queue = {}
-        self.visited = {}
-        
-        # for initial position, total dist = dist
-        self.visited[character.position] = (0, self.distance(character.position, target_pos), self.distance(character.position, target_pos), None)
+        key = self.cache_key(character.position, tuple(target_pos))
+        if key in self.path_cache:
+            self.cache_hits += 1
+            return self.path_cache[key]
+        self.cache_misses += 1
         
         # list of all possible (empty) adjacent square around target, goal is to calculate all space around them
         target_neighbors = self.character_manager.instance_board.check_surrounding_occupied(target_pos)
             
         adjacent_results = self.get_adjacent_path (character, target_pos, target_neighbors)
         
-        # IMPORTANT! looking for quickest path to target and returning its cost
-        min_cost = min(adjacent_results, key=lambda pos: adjacent_results[pos][0])
-        min_cost_pos = adjacent_results[min_cost][0]
+        if not adjacent_results:
+            min_cost_pos = float('inf')
+        else:
+            # IMPORTANT! looking for quickest path to target and returning its cost
+            min_cost = min(adjacent_results, key=lambda pos: adjacent_results[pos][0])
+            min_cost_pos = adjacent_results[min_cost][0]
         
+        self.path_cache[key] = min_cost_pos
         return min_cost_pos
     
     def sort_path (self, path):
         sorted_path = sorted(path.items(), key=lambda item: item[1][0])  # item[1][0] is the cost value
         
-        print("Sorted Path from Lowest to Highest Cost:")
+        if self.character_manager.headless:
+            return
+        self.character_manager.log("Sorted Path from Lowest to Highest Cost:")
         for pos, (cost, distance, total_cost, parent) in sorted_path:
-            print(f"Position: {pos}, Cost: {cost}, Distance: {distance} Total distance: {total_cost} Parent: {parent}")
-        print(f" Path found: {sorted_path}")
+            self.character_manager.log(f"Position: {pos}, Cost: {cost}, Distance: {distance} Total distance: {total_cost} Parent: {parent}")
+        self.character_manager.log(f" Path found: {sorted_path}")
         
         return sorted_path
     
-    def check_hp (self, e_team):
-        score_dict = {}
-        for enemy in e_team:
-            c_hp = enemy.instance_hp.current_hp
-            m_hp = enemy.instance_hp.base_hp
-            ratio = c_hp / m_hp
-            score = 100 - (ratio * 100)
-            score_dict[enemy] = score
-            
-        max_value = max(score_dict.values())
-        if max_value > 0:
-            normalized_dict = {e: (x / max_value) * 100 for e, x in score_dict.items()}
-        else:
-            normalized_dict = score_dict  
-
-        return normalized_dict
-    
     def check_ac(self, e_team):
         score_dict = {}
 
@@ -3023,62 +4187,12 @@ class Algorithms():
 
         return score_dict
     
-    def check_threat(self, c, e_team):
-        
-        score_dict = {}
-
-        for enemy in e_team:
-            reach = enemy.instance_equipment.first_weapon["reach"]
-            score_1 = 25 if reach>5 else 50 if reach>10 else 0
-            
-            lvl = enemy.level
-            score_3 = lvl * 5 # 5-100 pts
-                
-            score_4 = 100 if enemy.instance_hp.status==1 else 0
-            
-            score_sum = (score_1+score_3+score_4) / 4
-            
-            score_dict[enemy] = score_sum
-            
-        max_value = max(score_dict.values())
-        normalized_dict = {e: (x / max_value) * 100 for e, x in score_dict.items()}
-        
-        return normalized_dict
-    
-    def check_dist_melee (self, e_team, char):
-        
-        score_dict = {}
-        move_dict = {}
-        
-        for enemy in e_team:
-            move_pts = self.check_target_cost (char, enemy.position)
-            move_dict[enemy] = move_pts
-        
-        m_pts = char.move_points 
-    
-        for enemy, move_pts in move_dict.items():
-            if move_pts <= m_pts:
-                score_dict[enemy] = 100
-            elif m_pts < move_pts <= m_pts * 2:
-                score_dict[enemy] = 40
-            else:
-                score_dict[enemy] = 0
-        
-        max_value = max(score_dict.values())
-        
-        if max_value > 0:
-            normalized_dict = {e: (x / max_value) * 100 for e, x in score_dict.items()}
-        else:
-            normalized_dict = score_dict  
-
-        return normalized_dict   
-    
     def AI_move(self, c, t=None, mv_pts=None):
         # move towards target
         t = self.character_manager.instance_AI.target
         mv_pts = c.c_move_points
         
-        print(f"DEBUG: target: {t.name}, mvpoints: {mv_pts}, char: {c.name} ")
+        self.character_manager.log(f"DEBUG: target: {t.name}, mvpoints: {mv_pts}, char: {c.name} ")
         old_pos = c.position
         
         new_pos, pts_cost = self.character_manager.instance_event_manager.AI_check_move(c, t.position, mv_pts, False)
@@ -3089,13 +4203,14 @@ class Algorithms():
         return pts_cost
     
     def check_weapon_reach(self, c):
-        reach = c.instance_equipment.first_weapon["reach"]
+        reach = c.instance_equipment.first_weapon.reach
         return reach if reach in [5,10] else False
     
     def check_char_surround(self, character):
         # method for checking enemies
         
-        board = self.character_manager.instance_board.p_board
+        board = self.character_manager.instance_board
+        positions = self.character_manager.positions
         
         try:
             x, y = character.position
@@ -3116,18 +4231,18 @@ class Algorithms():
         for dx, dy in moves:
             new_x, new_y = x + dx, y + dy
 
-            if 0 <= new_x < len(board[0]) and 0 <= new_y < len(board):
-                occupant = board[new_y][new_x]
-                for opponent in team:
-                    if occupant == opponent.name[:2].title():
-                        surrounding_characters.append(opponent.name)
+            if 0 <= new_x < board.size and 0 <= new_y < board.size:
+                occupant = positions.get((new_x, new_y))
+                if occupant is not None and occupant in team:
+                    surrounding_characters.append(occupant.name)
 
         return surrounding_characters
     
     def check_char_surround_allies(self, character):
         # method for checking allies adjacent to char
         
-        board = self.character_manager.instance_board.p_board
+        board = self.character_manager.instance_board
+        positions = self.character_manager.positions
         
         try:
             x, y = character.position
@@ -3136,7 +4251,7 @@ class Algorithms():
         
         team = (self.character_manager.instance_event_manager.team_two 
                         if character.team == 1 else self.character_manager.instance_event_manager.team_one)
-        print("team around char", team)
+        self.character_manager.log("team around char", team)
         
         surrounding_characters = []
         
@@ -3149,52 +4264,202 @@ class Algorithms():
         for dx, dy in moves:
             new_x, new_y = x + dx, y + dy
 
-            if 0 <= new_x < len(board[0]) and 0 <= new_y < len(board):
-                occupant = board[new_y][new_x]
-                for opponent in team:
-                    if occupant == opponent.name[:2].title():
-                        surrounding_characters.append(opponent.name)
+            if 0 <= new_x < board.size and 0 <= new_y < board.size:
+                occupant = positions.get((new_x, new_y))
+                if occupant is not None and occupant in team:
+                    surrounding_characters.append(occupant.name)
 
         return surrounding_characters
     
-    def check_hit_possibility(self, c, e):
-        mod = c.instance_modifiers.attack_mod_w1
-        adv = self.character_manager.instance_action.check_advantage(c, e)
-        dis = self.character_manager.instance_action.check_disadvantage(c, e)
-        ac = e.instance_armor_class.armor_class
-        
-        needed_roll = max(ac - mod, 1)
+    def normalize (self, column):
+        # scale to max 100 (all zeros stay zeros)
+        max_value = column.max()
+        return column / max_value * 100 if max_value > 0 else column
+    
+    def score_hp (self, e_team):
+        # missing HP in %
+        current = np.array([e.instance_hp.current_hp for e in e_team], dtype=float)
+        base = np.array([e.instance_hp.base_hp for e in e_team], dtype=float)
+        return self.normalize(100 - (current / base * 100))
+    
+    def score_hit (self, c, e_team):
+        # chance to hit in % (natural 1 / 20 - 5% / 95%), with advantage / disadvantage
+        action = self.character_manager.instance_action
+        ac = np.array([e.instance_armor_class.armor_class for e in e_team])
+        adv = np.array([bool(action.check_advantage(c, e)) for e in e_team])
+        dis = np.array([bool(action.check_disadvantage(c, e)) for e in e_team])
+        
+        needed = np.maximum(ac - c.instance_modifiers.attack_mod_w1, 1)
+        probability = np.where(adv, (21 - needed) ** 2 / 400, np.where(dis, 1 - ((needed - 1) ** 2 / 400), (21 - needed) / 20))
+        score = np.round(probability * 100, 2)
+        score = np.where(needed >= 21, 5.0, np.where(needed <= 1, 95.0, score))
+        return self.normalize(score)
+    
+    def score_threat (self, c, e_team):
+        # reach, level and if enemy is still standing
+        reach = np.array([e.instance_equipment.first_weapon.reach for e in e_team])
+        level = np.array([e.level for e in e_team])
+        alive = np.array([e.instance_hp.status == 1 for e in e_team])
+        return self.normalize((np.where(reach > 5, 25, 0) + level * 5 + np.where(alive, 100, 0)) / 4)
+    
+    def score_distance (self, c, e_team):
+        # 100 - reachable with move points, 40 - with dash, 0 - further
+        field = self.cost_field(c)
+        cost = np.array([field.ring_cost(e.position) for e in e_team])
+        m_pts = c.move_points
+        return self.normalize(np.where(cost <= m_pts, 100.0, np.where(cost <= m_pts * 2, 40.0, 0.0)))
+    
+    def score_cover (self, c, e_team):
+        # cover level of the line to every enemy (LineOfSight.cover_scores), free line of sight - highest score
+        cover = self.character_manager.instance_los.cover_scores(c.position, [e.position for e in e_team])
+        return self.normalize(cover.astype(float))
+    
+    def score_damage (self, c, e_team):
+        # expected damage per round against every enemy, exact (DamageCalculator)
+        damage = self.character_manager.instance_damage
+        return self.normalize(np.array([damage.expected_dpr(c, e) for e in e_team]))
+    
+    def score_kill (self, c, e_team):
+        # chance to drop enemy to 0 HP this round, 0-100
+        damage = self.character_manager.instance_damage
+        return np.array([damage.kill_probability(c, e) * 100 for e in e_team])
+    
+    def target_scores (self, c, e_team, weights):
+        # weighted score of every enemy (numpy array, order of e_team) and used score columns {name: array}
+        # columns are memoized on AI blackboard, only columns with weight are calculated
+        con = self.character_manager.instance_conditions
+        scorers = {
+            "hp": lambda: self.score_hp(e_team),
+            "hit": lambda: self.score_hit(c, e_team),
+            "threat": lambda: self.score_threat(c, e_team),
+            "distance": lambda: self.score_distance(c, e_team),
+            "cover": lambda: self.score_cover(c, e_team),
+            "damage": lambda: self.score_damage(c, e_team),
+            "kill": lambda: self.score_kill(c, e_team),
+        }
         
-        if needed_roll >= 21:
-            return 5.0
-        elif needed_roll <= 1:
-            return 95.0
+        columns = {}
+        total = np.zeros(len(e_team))
+        for name, scorer in scorers.items():
+            weight = weights.get(name, 0)
+            if weight:
+                columns[name] = con.remember((name,) + tuple(e.name for e in e_team), c, scorer) # ranged profile can score only part of team
+                total = total + columns[name] * weight
         
-        # if normal roll
-        if not adv and not dis:
-            probability = (21 - needed_roll) / 20
+        return total / 4, columns
+
+
+def simulation_worker_init(names):
+    # process pool initializer, every worker has its own headless BattleContext with roster loaded from saved folder
+    global worker_context
+    worker_context = BattleContext(headless = True)
+    worker_context.load_saved(names)
+
+def simulation_worker_run(team_one, team_two, seeds, max_rounds):
+    # runs battles for given seeds, returns list of (winner, rounds, damage dealt, dead characters)
+    character_manager = worker_context
+    event_manager = character_manager.instance_event_manager
+    results = []
     
-        elif adv:
-            probability = ((21 - needed_roll) ** 2) / 400
-        
-        elif dis:
-            probability = 1 - (((needed_roll - 1) ** 2) / 400)
+    for seed in seeds:
+        winner, rounds = event_manager.start_headless_combat(team_one, team_two, seed, max_rounds)
+        dead = [name for name in team_one + team_two if character_manager.get_character(name).instance_hp.status == -1]
+        results.append((winner, rounds, dict(event_manager.damage_dealt), dead))
+    
+    return results
+
+class Simulator:
+    # Monte Carlo balance simulator, runs many headless battles (EventManager.turn) in process pool
+    Z = 1.96 # 95% confidence
+    
+    def __init__ (self, team_one, team_two, battles = 1000, workers = None, seed = None, max_rounds = 100):
+        self.team_one = list(team_one) # names of saved characters
+        self.team_two = list(team_two)
+        self.battles = battles
+        self.workers = workers or os.cpu_count() or 1
+        self.seed = seed
+        self.max_rounds = max_rounds
         
-        print(round(probability * 100, 2))
-        return round(probability * 100, 2)
+        self.results = []
+        self.elapsed = 0
     
-    def check_hit_prob (self, c, opposing_team):
+    def battle_seeds(self):
+        # one independent seed per battle, same master seed gives same battles no matter how they are split between workers
+        return [int(s) for s in np.random.SeedSequence(self.seed).generate_state(self.battles)]
+    
+    def chunks(self, seeds):
+        size = max(1, len(seeds) // (self.workers * 4))
+        return [seeds[i:i + size] for i in range(0, len(seeds), size)]
+    
+    def run(self):
+        start = time.perf_counter()
+        chunks = self.chunks(self.battle_seeds())
+        names = self.team_one + self.team_two
+        
+        self.results = []
+        with ProcessPoolExecutor(max_workers = self.workers, initializer = simulation_worker_init, initargs = (names,)) as executor:
+            futures = [executor.submit(simulation_worker_run, self.team_one, self.team_two, chunk, self.max_rounds) for chunk in chunks]
+            for future in futures:
+                self.results.extend(future.result())
+        
+        self.elapsed = time.perf_counter() - start
+        return self.summary()
+    
+    def wilson(self, k, n):
+        # Wilson score interval for proportion k/n
+        if n == 0:
+            return 0.0, 0.0, 0.0
+        z = self.Z
+        p = k / n
+        centre = (p + z*z / (2*n)) / (1 + z*z / n)
+        half = z * sqrt(p*(1 - p)/n + z*z / (4*n*n)) / (1 + z*z / n)
+        return p, centre - half, centre + half
+    
+    def mean_ci(self, values):
+        # mean with normal approximation interval
+        n = len(values)
+        if n == 0:
+            return 0.0, 0.0, 0.0
+        mean = sum(values) / n
+        if n == 1:
+            return mean, mean, mean
+        sd = sqrt(sum((v - mean)**2 for v in values) / (n - 1))
+        half = self.Z * sd / sqrt(n)
+        return mean, mean - half, mean + half
+    
+    def summary(self):
+        n = len(self.results)
+        winners = [r[0] for r in self.results]
+        
+        summary = {
+            "battles": n,
+            "team_one": self.wilson(winners.count(1), n),
+            "team_two": self.wilson(winners.count(2), n),
+            "draw": self.wilson(winners.count(0), n),
+            "rounds": self.mean_ci([r[1] for r in self.results]),
+            "characters": {},
+        }
         
-        score_dict = {}
-        for e in opposing_team:
-            x = self.check_hit_possibility(c,e)
-            score_dict[e] = x
+        for name in self.team_one + self.team_two:
+            summary["characters"][name] = {
+                "damage": self.mean_ci([r[2].get(name, 0) for r in self.results]),
+                "death": self.wilson(sum(name in r[3] for r in self.results), n),
+            }
         
-        max_value = max(score_dict.values())
-        normalized_dict = {e: (x / max_value) * 100 for e, x in score_dict.items()}
+        return summary
+    
+    def report(self, summary = None):
+        summary = summary or self.summary()
+        fmt = lambda v, pct = True: f"{v[0]*100:6.1f}% [{v[1]*100:5.1f} - {v[2]*100:5.1f}]" if pct else f"{v[0]:6.1f} [{v[1]:5.1f} - {v[2]:5.1f}]"
         
-        return normalized_dict
-
+        print(f"\n{summary['battles']} battles, {self.workers} workers, {self.elapsed:.1f} s")
+        print(f"Team one {self.team_one} win rate: {fmt(summary['team_one'])}")
+        print(f"Team two {self.team_two} win rate: {fmt(summary['team_two'])}")
+        print(f"Draws (round limit {self.max_rounds}): {fmt(summary['draw'])}")
+        print(f"Average rounds: {fmt(summary['rounds'], False)}")
+        print(f"{'character':<12} {'damage per battle':>22} {'death rate':>24}")
+        for name, stats in summary["characters"].items():
+            print(f"{name:<12} {fmt(stats['damage'], False):>22} {fmt(stats['death']):>24}")
 
 class MainMenu:
     def __init__ (self):
@@ -3210,7 +4475,9 @@ class MainMenu:
             print("4. Start game")
             print("5. Save current character")
             print("6. Display loaded character")
-            print("7. Exit")
+            print("7. Headless battle (AI vs AI)")
+            print("8. Monte Carlo simulation")
+            print("9. Exit")
             
             # print(f"Current statistics:")
             # for char in self.character_manager.characters.values():
@@ -3237,6 +4504,10 @@ class MainMenu:
             elif choice == '6':
                 self.display_loaded()
             elif choice == '7':
+                self.headless_battle()
+            elif choice == '8':
+                self.simulation()
+            elif choice == '9':
                 print("Exiting game...")
                 break
             else:
@@ -3288,6 +4559,43 @@ class MainMenu:
         self.clear_game_cache()
         EventManager.next_action(self)
         
+    def headless_battle(self):
+        # teams balanced by level, same as automatic teams in EventManager
+        event_manager = self.character_manager.instance_event_manager
+        seed = input("Seed (empty for random): ").strip()
+        seed = int(seed) if seed else None
+        
+        self.character_manager.set_headless(True) # quiet team picking
+        event_manager.teams(True)
+        team_one, team_two = list(event_manager.team_one), list(event_manager.team_two)
+        
+        self.character_manager.instance_AI.profile(True)
+        start = time.perf_counter()
+        winner, rounds = event_manager.start_headless_combat(team_one, team_two, seed)
+        elapsed = time.perf_counter() - start
+        self.character_manager.set_headless(False)
+        self.character_manager.instance_AI.profile(False)
+        
+        print(f"Team one: {[c.name for c in team_one]} /// Team two: {[c.name for c in team_two]}")
+        print(f"Winner: {'draw' if winner == 0 else f'team {winner}'} after {rounds} rounds ({elapsed*1000:.1f} ms)")
+        for c in team_one + team_two:
+            print(f"{c.name}: HP {c.instance_hp.current_hp}/{c.instance_hp.base_hp} status {c.instance_hp.status}")
+        
+        print(f"Path cache: {self.character_manager.instance_algorithms.cache_info()}")
+        print("AI decision time per behaviour tree node:")
+        for path, calls, total, mean in self.character_manager.instance_AI.node_stats()[:10]:
+            print(f"{path:<70} {calls:>5} calls {total:8.2f} ms {mean:8.1f} us")
+        
+    def simulation(self):
+        # teams and number of battles from input, characters are loaded by every worker from saved folder
+        team_one = [name.strip().title() for name in input("Team one (names of saved characters, separated by comma): ").split(",")]
+        team_two = [name.strip().title() for name in input("Team two (names of saved characters, separated by comma): ").split(",")]
+        battles = input("Number of battles (default 1000): ").strip()
+        seed = input("Seed (empty for random): ").strip()
+        
+        simulator = Simulator(team_one, team_two, int(battles) if battles else 1000, seed = int(seed) if seed else None)
+        simulator.report(simulator.run())
+        
     def clear_game_cache(self):
         #TODO for testing purposes
         for char in self.character_manager.characters.values():
@@ -3358,11 +4666,30 @@ class Pgame:
         #buttons
         self.button_pos = {}
         self.button_action = {}
+        
+        # rendering cache - background, frame and terrain drawn once into board_layer, rebuilt when board terrain changes
+        self.board_layer = None
+        self.board_layer_key = None
+        self.char_tiles = {} # rect -> (color, initials) of characters currently drawn on screen
+        self.dirty_rects = [] # parts of screen changed since last display update
+        self.panel_state = None # state shown in side panel (interface_state), panel is drawn only when it changes
+        self.log_state = None # (logs added, scroll) shown in log box
+        self.log_count = 0 # all logs added, also after the oldest ones were removed
+        self.info_surface = None
+        
+        # fonts are loaded once in initialize_screen, rendered text surfaces are kept in LRU cache
+        self.fonts = {} # {(name, size): Font}, name None - pygame default font, other names - system fonts
+        self.text_cache = {} # {(name, size, text, color): Surface}, dict order is used as LRU order
+        self.max_text_cache = 512
+        self.text_hits = 0
+        self.text_misses = 0
     
     def initialize_screen(self):
         pygame.init()
         self.screen = pygame.display.set_mode((1500, 1200))
         pygame.display.set_caption("Board Visualization")
+        for name, size in [(None, 16), (None, 18), (None, 20), (None, 24), (None, 32), ('Arial', 16)]:
+            self.get_font(name, size)
 
         self.draw_board()
         self.draw_interface()
@@ -3372,65 +4699,132 @@ class Pgame:
     def update_pygame (self, char):
         
         self.character = char
-        self.draw_turn_info()
-        self.draw_board()
-        self.draw_info()
+        self.draw_board() # also draws interface (turn info, logs)
         self.refresh = True
 
-    def draw_board(self):
-        self.screen.blit(self.background, (0, 0))
-        self.screen_width, self.screen_height = self.screen.get_size()
+    def get_font(self, name, size):
+        # SysFont searches system font list, very slow to call every frame
+        key = (name, size)
+        if key not in self.fonts:
+            self.fonts[key] = pygame.font.Font(None, size) if name is None else pygame.font.SysFont(name, size)
+        return self.fonts[key]
+    
+    def render_text(self, name, size, text, color):
+        # rendered text from cache, least recently used surface is removed when cache is full
+        key = (name, size, text, color)
+        surface = self.text_cache.pop(key, None)
+        if surface is None:
+            self.text_misses += 1
+            surface = self.get_font(name, size).render(text, True, color)
+            if len(self.text_cache) >= self.max_text_cache:
+                del self.text_cache[next(iter(self.text_cache))]
+        else:
+            self.text_hits += 1
+        self.text_cache[key] = surface
+        return surface
     
-        # Obliczenie offsetu (przesunięcia) w celu wyśrodkowania planszy
-        screen_m_width = self.screen_width - self.panel_width
-        self.offset_x = (screen_m_width - self.b_width) // 2
-        self.offset_y = (self.screen_height - self.b_height) // 8
+    def text_cache_info(self):
+        return {"hits": self.text_hits, "misses": self.text_misses, "size": len(self.text_cache), "max": self.max_text_cache}
+    
+    def build_board_layer(self):
+        # background, frame around board and terrain tiles, blitted to screen as a whole or used to restore parts of it
+        layer = pygame.Surface((self.screen_width, self.screen_height))
+        layer.blit(self.background, (0, 0))
         
         frame_rect = pygame.Rect(self.offset_x - 5, self.offset_y - 5, self.b_width + 10, self.b_height + 10)  # Ramka wokół planszy
-        pygame.draw.rect(self.screen, self.black, frame_rect, 4)  # 5 to grubość ramki
+        pygame.draw.rect(layer, self.black, frame_rect, 4)  # 5 to grubość ramki
+        
+        terrain = self.character_manager.instance_board.terrain.tolist()
+        terrain_colors = {Board.GRASS: self.colors["grass"], Board.FOREST: self.colors["forest"], Board.HILL: self.colors["mountain"]}
         
         for y in range(self.BS):
             for x in range(self.BS):
                 rect = pygame.Rect(x * self.tile_size + self.offset_x, y * self.tile_size + self.offset_y, self.tile_size, self.tile_size)
                 
-                # Dobieranie koloru w zależności od symbolu w self.i_board
-                terrain_type = self.character_manager.instance_board.i_board[y][x]
-                
-                if terrain_type == " . ":  # grass
-                    color = self.colors["grass"]
-                elif terrain_type == " | ":  # forest
-                    color = self.colors["forest"]
-                elif terrain_type == " /\\":  # hills
-                    color = self.colors["mountain"]
-                else:
-                    color = self.white  # Domyślnie białe tło dla nieznanych symboli
-
-                pygame.draw.rect(self.screen, color, rect)  # Rysowanie pola planszy
-                pygame.draw.rect(self.screen, self.black, rect, 1)  # Obrys kratki
+                # Dobieranie koloru w zależności od terenu
+                color = terrain_colors.get(terrain[y][x], self.white)  # Domyślnie białe tło dla nieznanych symboli
+
+                pygame.draw.rect(layer, color, rect)  # Rysowanie pola planszy
+                pygame.draw.rect(layer, self.black, rect, 1)  # Obrys kratki
+        return layer
+    
+    def restore_area(self, rect):
+        # paint board layer over part of screen (removes characters, popups), characters and panels inside are drawn again on next draw_board
+        self.screen.blit(self.board_layer, rect, rect)
+        self.dirty_rects.append(pygame.Rect(rect))
+        rect = pygame.Rect(rect)
+        self.char_tiles = {tile: value for tile, value in self.char_tiles.items() if not rect.colliderect(tile)}
+        self.panel_state = None
+        self.log_state = None
+    
+    def interface_state(self):
+        # everything shown in side panel about acting character
+        c = self.character
+        if c is None:
+            return ()
+        return (c.name, c.race, c.class_name, c.level, tuple(c.abilities.values()), c.instance_hp.current_hp, c.instance_hp.base_hp,
+                c.c_move_points, c.c_actions, c.c_attacks)
+    
+    def flush(self):
+        # display update limited to changed parts of screen
+        if self.dirty_rects:
+            pygame.display.update(self.dirty_rects)
+            self.dirty_rects = []
 
+    def draw_board(self):
+        self.screen_width, self.screen_height = self.screen.get_size()
+    
+        # Obliczenie offsetu (przesunięcia) w celu wyśrodkowania planszy
+        screen_m_width = self.screen_width - self.panel_width
+        self.offset_x = (screen_m_width - self.b_width) // 2
+        self.offset_y = (self.screen_height - self.b_height) // 8
+        
+        # terrain is drawn only after board (re)generation, otherwise whole layer stays on screen
+        board = self.character_manager.instance_board
+        key = (board.terrain_version, self.screen_width, self.screen_height)
+        if self.board_layer_key != key:
+            self.board_layer = self.build_board_layer()
+            self.board_layer_key = key
+            self.screen.blit(self.board_layer, (0, 0))
+            self.char_tiles = {}
+            self.panel_state = None
+            self.log_state = None
+            self.dirty_rects.append(self.screen.get_rect())
+        
+        team_one = self.character_manager.instance_event_manager.team_one
+        team_two = self.character_manager.instance_event_manager.team_two
+        char_tiles = {}
         for character in self.character_manager.characters.values():
             if not hasattr(character, 'position'):
                 print(f"{character.name} has no position attribute!")
                 continue
-
-            x, y = character.position
-            team_two = self.character_manager.instance_event_manager.team_two
-            team_one = self.character_manager.instance_event_manager.team_one
             
             if character not in team_one and character not in team_two:
                 continue  # Przeskoczenie tej postaci
             
+            x, y = character.position
             color = self.colors["player"] if character in team_one else self.colors["enemy"]
-            player_rect = pygame.Rect(x * self.tile_size + self.offset_x, y * self.tile_size + self.offset_y, self.tile_size, self.tile_size)
-            pygame.draw.rect(self.screen, color, player_rect)
+            tile = (x * self.tile_size + self.offset_x, y * self.tile_size + self.offset_y, self.tile_size, self.tile_size)
+            char_tiles[tile] = (color, character.name[:2])
+        
+        # only tiles that changed since last frame - characters that moved, died or changed team
+        for tile, value in self.char_tiles.items():
+            if char_tiles.get(tile) != value:
+                self.screen.blit(self.board_layer, tile, tile)
+                self.dirty_rects.append(pygame.Rect(tile))
+        
+        for tile, (color, initials) in char_tiles.items():
+            if self.char_tiles.get(tile) == (color, initials):
+                continue
+            pygame.draw.rect(self.screen, color, tile)
             
             # Dodajemy inicjały na planszy
-            font = pygame.font.Font(None, 18)
-            initials = font.render(character.name[:2], True, self.white)
-            self.screen.blit(initials, (x * self.tile_size + 5 + self.offset_x, y * self.tile_size + 5 + self.offset_y))
+            self.screen.blit(self.render_text(None, 18, initials, self.white), (tile[0] + 5, tile[1] + 5))
+            self.dirty_rects.append(pygame.Rect(tile))
+        self.char_tiles = char_tiles
         
         self.draw_interface()
-        pygame.display.update()  # Aktualizacja całego ekranu
+        self.flush()
 
     def draw_interface(self):
         # auto fit method, no variables
@@ -3438,6 +4832,13 @@ class Pgame:
         self.x_i = self.screen_width - self.panel_width - self.frame_i
         self.y_i = (self.screen_height - self.b_height) // 8
         
+        # side panel and buttons only when acting character or its stats changed, logs only when new log or scroll
+        self.draw_info()
+        state = self.interface_state()
+        if state == self.panel_state:
+            return
+        self.panel_state = state
+        
         # background
         panel_rect = pygame.Rect(self.x_i, self.y_i, self.panel_width, self.b_height)
         self.screen.blit(self.panel_bg, panel_rect)
@@ -3446,16 +4847,23 @@ class Pgame:
         self.frame_i2 = 4
         frame_rect = pygame.Rect(self.x_i-self.frame_i2, self.y_i, self.panel_width+self.frame_i2, self.b_height+self.frame_i2)
         pygame.draw.rect(self.screen, self.black, frame_rect, self.frame_i2)  # Rysowanie ramki wokół panelu
+        self.dirty_rects.append(frame_rect)
 
         self.draw_turn_info()
         self.draw_char_info()
         self.draw_end_turn_button()
-        self.draw_info()
         self.draw_buttons()
     
     def draw_info(self):
-        # Tworzenie maskującej powierzchni dla logów (obszar, w którym logi będą widoczne)
-        info_surface = pygame.Surface((self.b_width + self.panel_width + (3 * self.frame_i), 100))
+        state = (self.log_count, self.log_scroll)
+        if state == self.log_state:
+            return
+        self.log_state = state
+        
+        # Tworzenie maskującej powierzchni dla logów (obszar, w którym logi będą widoczne), tworzona raz
+        if self.info_surface is None:
+            self.info_surface = pygame.Surface((self.b_width + self.panel_width + (3 * self.frame_i), 100))
+        info_surface = self.info_surface
         
         # Tworzenie prostokąta dla powierzchni logów
         info_rect = pygame.Rect(self.offset_x - 4, self.offset_y + self.b_height + 17, self.b_width + self.panel_width + (3 * self.frame_i), 100)
@@ -3468,11 +4876,9 @@ class Pgame:
         visible_logs = self.logs[max(0, len(self.logs) - max_lines - self.log_scroll): len(self.logs) - self.log_scroll]
         visible_logs.reverse()
         
-        log_font = pygame.font.SysFont('Arial', 16)  # Użyj czcionki Arial o rozmiarze 20
-        
-        # Rysowanie logów na nowej powierzchni
+        # Rysowanie logów na nowej powierzchni (czcionka Arial, rozmiar 16)
         for i, log in enumerate(visible_logs):
-            log_surface = log_font.render(log, True, self.black)
+            log_surface = self.render_text('Arial', 16, log, self.black)
             info_surface.blit(log_surface, (5, 5 + i * self.line_height))
         
         # Rysowanie powierzchni logów w ramce (przypisanie info_surface do ekranu)
@@ -3480,9 +4886,7 @@ class Pgame:
         
         # adding frame
         pygame.draw.rect(self.screen, self.black, info_rect, 4)
-
-        # Aktualizacja ekranu, aby logi się pojawiły
-        pygame.display.update()
+        self.dirty_rects.append(info_rect)
 
     def add_log(self, text):
         """Dodaje nowy wpis do logu wraz z aktualną godziną."""
@@ -3492,9 +4896,11 @@ class Pgame:
         if len(self.logs) >= self.max_logs:
             self.logs.pop(0)  # Usuń najstarszy wpis, jeśli lista przekroczy limit 100
         self.logs.append(log_entry)
+        self.log_count += 1
         
+        # Aktualizacja ekranu, aby logi się pojawiły
         self.draw_info()
-        pygame.display.update()
+        self.flush()
         
     def handle_log_scroll(self, event):
         if event.type == pygame.MOUSEBUTTONDOWN:
@@ -3516,8 +4922,6 @@ class Pgame:
             pygame.draw.rect(self.screen, self.white, header_rect)  
             pygame.draw.rect(self.screen, self.black, header_rect, 2)  # Ramka wokół paska
             
-            turn_font = pygame.font.Font(None, 24)
-            
             RACE = " ".join(["Race:", str(self.character.race)])
             CLASS = " ".join(["Class:", str(self.character.class_name)])
             LEVEL = " ".join(["Level:", str(self.character.level)])
@@ -3533,10 +4937,11 @@ class Pgame:
             y_offset = header_rect.top + 45
             
             for line in all_text_lines:
-                turn_text = turn_font.render(line, True, self.black)
+                turn_text = self.render_text(None, 24, line, self.black)
                 turn_text_rect = turn_text.get_rect(topleft=(header_rect.left + 10, y_offset))
                 self.screen.blit(turn_text, turn_text_rect)
                 y_offset += turn_text.get_height() + 5  # Przesunięcie o wysokość linii + odstęp
+            self.dirty_rects.append(header_rect)
         except:
             ...
         
@@ -3558,14 +4963,12 @@ class Pgame:
             pygame.draw.rect(self.screen, self.black, header_rect, 2)  # Ramka wokół paska
 
             # Nazwa postaci (większa czcionka)
-            name_font = pygame.font.Font(None, 32)
-            name_text = name_font.render(self.character.name, True, self.black)
+            name_text = self.render_text(None, 32, self.character.name, self.black)
             name_text_rect = name_text.get_rect(center=(header_rect.centerx, header_rect.top + 20))
             self.screen.blit(name_text, name_text_rect)
             
             # Tekst "turn" (mniejsza czcionka)
-            turn_font = pygame.font.Font(None, 24)
-            turn_text = turn_font.render("turn", True, self.black)
+            turn_text = self.render_text(None, 24, "turn", self.black)
             turn_text_rect = turn_text.get_rect(center=(header_rect.centerx, header_rect.top + 45))
             self.screen.blit(turn_text, turn_text_rect)
         except:
@@ -3577,8 +4980,6 @@ class Pgame:
             self.button_h = 50
             
             offset = 0
-            font = pygame.font.Font(None, 16)
-            action_font = pygame.font.Font(None, 16)
             
             for i in range(19):
                 header_rect = pygame.Rect(self.offset_x-self.button_w-15, self.offset_y + offset, self.button_w, self.button_h)
@@ -3594,11 +4995,12 @@ class Pgame:
                 else:
                     text = f"s{i-9}"
                 
-                text_surf = font.render(text, True, self.black)
+                text_surf = self.render_text(None, 16, text, self.black)
                 self.screen.blit(text_surf, (header_rect.x + 5, header_rect.y + 5))
                 
-                # store buttons position
+                # store buttons position, only drawn button is marked dirty, gaps between buttons are never redrawn
                 self.button_pos[i+1] = header_rect
+                self.dirty_rects.append(header_rect)
                 
                 #store buttons 
                 action_function, action_name =self.get_actions(i)
@@ -3607,7 +5009,7 @@ class Pgame:
                 
                 #write txt
 
-                action_text_surf = action_font.render(action_name, True, self.black)
+                action_text_surf = self.render_text(None, 16, action_name, self.black)
                 action_text_x = header_rect.x + (self.button_w - action_text_surf.get_width()) // 2
                 action_text_y = header_rect.y + (self.button_h - action_text_surf.get_height()) // 2
                 self.screen.blit(action_text_surf, (action_text_x, action_text_y))
@@ -3655,8 +5057,7 @@ class Pgame:
         pygame.draw.rect(self.screen, self.black, button_rect, 2)  # Ramka przycisku
 
         # Tekst "END TURN" na przycisku
-        font = pygame.font.Font(None, 24)
-        button_text = font.render("END TURN", True, self.black)
+        button_text = self.render_text(None, 24, "END TURN", self.black)
         button_text_rect = button_text.get_rect(center=button_rect.center)
         self.screen.blit(button_text, button_text_rect)
         
@@ -3676,13 +5077,10 @@ class Pgame:
         pygame.draw.rect(self.screen, self.black, popup_rect, 2)  # Ramka dla popupu
 
         # Dodanie tekstu
-        font = pygame.font.Font(None, 20)
-        popup_text = font.render(text, True, self.black)
+        popup_text = self.render_text(None, 20, text, self.black)
         text_rect = popup_text.get_rect(center=popup_rect.center)
         self.screen.blit(popup_text, text_rect)
-
-        # Aktualizacja ekranu, aby popup się pojawił
-        pygame.display.update(popup_rect)
+        self.dirty_rects.append(popup_rect)
 
     def handle_right_click(self, pos):
         # Pobieranie pozycji myszy na planszy
@@ -3717,11 +5115,8 @@ class Pgame:
         # Ustawienie prostokąta dla popupu, który chcemy wyczyścić
         popup_rect = pygame.Rect(popup_x, popup_y, popup_width, popup_height)
 
-        # Rysowanie planszy na miejscu popupu, aby go wyczyścić
-        pygame.draw.rect(self.screen, self.white, popup_rect)
-
-        # Aktualizacja ekranu, aby wyczyścić popup
-        pygame.display.update(popup_rect)
+        # Rysowanie planszy na miejscu popupu, aby go wyczyścić (postacie i panele zostaną dorysowane w draw_board)
+        self.restore_area(popup_rect)
         
     def main_loop (self):
         print(">>>>>>>> MAIN LOOP PYGAME <<<<<<<<<<<<")
@@ -3736,11 +5131,8 @@ class Pgame:
                 self.run_game(character)
 
         
-        self.draw_interface()
         self.draw_board()
 
-        pygame.display.update()
-
     def run_game(self, character):
         self.character = character
         clock = pygame.time.Clock()
@@ -3768,7 +5160,6 @@ class Pgame:
                         
                         if cond == False:
                             self.draw_board()
-                            self.draw_interface()
                             self.refresh = True
                             continue
                     
@@ -3796,16 +5187,15 @@ class Pgame:
                 #always active, add more info to log
                 self.handle_log_scroll(event)
 
-            # Rysowanie planszy i interfejsu
+            # Rysowanie planszy i interfejsu (draw_board rysuje też interfejs)
             if self.refresh:
                 self.draw_board()
-                self.draw_interface()
                 self.refresh = False
                 
-            if self.current_popup_text:
-                self.draw_popup(self.current_popup_pos, self.current_popup_text)
+                if self.current_popup_text:
+                    self.draw_popup(self.current_popup_pos, self.current_popup_text)
                 
-            pygame.display.update()
+            self.flush()
             clock.tick(10)
     
     def get_click_pos(self):
@@ -3859,11 +5249,55 @@ class Pgame:
         print("pos: ",pos)
         
         t = self.character_manager.instance_algorithms.get_char_from_pos(pos) if self.character_manager.instance_algorithms.is_enemy(c,pos) else None
+    
+    def quit(self):
+        self.character_manager.log(f"DEBUG: text cache {self.text_cache_info()}")
+        pygame.quit()
+
+class NullPgame:
+    # renderer for headless mode, same calls as Pgame but nothing is drawn or logged
+    def __init__(self, character_manager) -> None:
+        self.character_manager = character_manager
+        self.character = None
+        self.event_queue = queue.Queue()
+        self.logs = []
+    
+    def initialize_screen(self):
+        pass
+    
+    def update_pygame(self, char):
+        self.character = char
+    
+    def draw_board(self):
+        pass
+    
+    def draw_info(self):
+        pass
+    
+    def add_log(self, text):
+        pass
+    
+    def main_loop(self):
+        pass
+    
+    def quit(self):
+        pass
 
-os.system('cls')
-main_menu = MainMenu()
-main_menu.display_menu()
-pygame.quit()
+if __name__ == "__main__" and len(sys.argv) > 1 and sys.argv[1] == "simulate":
+    # python DnD.py simulate Orc,Gimli Aragorn [battles] [seed]
+    simulator = Simulator(sys.argv[2].split(","), sys.argv[3].split(","), int(sys.argv[4]) if len(sys.argv) > 4 else 1000, seed = int(sys.argv[5]) if len(sys.argv) > 5 else None)
+    simulator.report(simulator.run())
+
+elif __name__ == "__main__" and len(sys.argv) > 1 and sys.argv[1] == "build-data":
+    # python DnD.py build-data - compile DnD/*.csv into data cache (also done automatically when csv files change)
+    Data().reload_data()
+    print(f"Data cache written to {Data().cache_path}")
+
+elif __name__ == "__main__":
+    os.system('cls')
+    main_menu = MainMenu()
+    main_menu.display_menu()
+    pygame.quit()
 
 # MANUAL TESTING METHOD testing repo
 
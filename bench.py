@@ -0,0 +1,175 @@
+import random as rd
+import time
+from math import sqrt
+
+from DnD import Algorithms, Board, Dice, PathFinder
+
+try:
+    from shapely.geometry import LineString, box # only for comparison with previous line of sight implementation
+except ImportError:
+    LineString = None
+
+# Benchmark of A* engine (PathFinder, binary heap) against previous implementation (linear scan over dict of open nodes)
+# and of grid line traversal (Algorithms.calc_pts_alongtheway) against previous shapely version
+# run: python bench.py
+
+class BenchManager:
+    # minimal holder for board and path finder, no pygame / characters needed
+    def __init__ (self, size, seed):
+        rd.seed(seed)
+
+        self.positions = {}
+        self.rng = Dice(seed)
+        self.instance_board = Board(self)
+        self.instance_pathfinder = PathFinder(self)
+
+        board = self.instance_board
+        board.size = size
+        board.board_signs = [" . "," | "," /\\"]
+        board.create_blank_board()
+        first_tiles, second_tiles = board.generate_terrain(0.2, 0.1)
+        board.generate_area(Board.FOREST, first_tiles)
+        board.generate_area(Board.HILL, second_tiles)
+
+        # random obstacles standing for characters
+        for _ in range(size):
+            x, y = rd.randrange(size), rd.randrange(size)
+            board.occupancy[y, x] = -1
+        board.version += 1
+
+    def free_positions (self, n):
+        board = self.instance_board
+        free = [(x, y) for y in range(board.size) for x in range(board.size) if board.occupancy[y, x] == 0]
+        return [tuple(rd.sample(free, 2)) for _ in range(n)]
+
+class LegacyAStar:
+    # copy of EventManager.check_move / calc_path before PathFinder was introduced, works on text boards
+    def __init__ (self, board):
+        self.board = board
+        self.size = board.size
+        self.board_signs = board.board_signs
+        self.i_board = board.i_board
+        self.p_board = board.p_board
+        self.path_queue = {}
+        self.visited = {}
+        self.expanded = 0
+
+    def distance (self, pos, target):
+        x1,y1 = pos
+        x2,y2 = target
+        return sqrt((x2 - x1)**2 + (y2 - y1)**2) * 5
+
+    def move_cost(self, new_pos, old_pos):
+        x1,y1 = old_pos
+        x2,y2 = new_pos
+        cost = 5 if x1==x2 or y1==y2 else 7.5
+        if self.i_board[y2][x2] == self.board_signs[2]:
+            cost *=2
+        return cost
+
+    def calc_path(self, old_pos, tar_pos, cost_old):
+        x, y = old_pos
+        surround = {}
+        moves = [(-1, -1), (0, -1), (1, -1), (-1, 0), (1, 0), (-1, 1), (0, 1), (1, 1)]
+
+        for dx, dy in moves:
+            new_x, new_y = x + dx, y + dy
+            pos = new_x, new_y
+            if 0 <= new_x < len(self.p_board[0]) and 0 <= new_y < self.size and pos not in self.visited:
+                if self.p_board[new_y][new_x] in self.board_signs:
+                    d = self.distance([new_x, new_y], tar_pos)
+                    cost = self.move_cost([new_x, new_y], [x, y]) + cost_old
+                    surround[(new_x, new_y)] = (cost, d, d + cost, old_pos)
+        return surround
+
+    def check_move(self, start, target_pos):
+        self.path_queue = {}
+        self.visited = {start: (0, self.distance(start, target_pos), self.distance(start, target_pos), None)}
+        self.path_queue = self.calc_path(start, target_pos, 0)
+
+        while self.path_queue:
+            min_cost = float('inf')
+            for position, values in self.path_queue.items():
+                if values[2] < min_cost:
+                    min_pos = position
+                    min_cost = values[2]
+
+            values = self.path_queue.pop(min_pos)
+            self.visited[min_pos] = values
+            self.expanded += 1
+
+            if min_pos == target_pos:
+                return values[0]
+
+            for pos, vals in self.calc_path(min_pos, target_pos, values[0]).items():
+                if pos not in self.path_queue or vals[2] < self.path_queue[pos][2]:
+                    self.path_queue[pos] = vals
+        return float('inf')
+
+def legacy_pts_alongtheway (pos_start, pos_end):
+    # copy of Algorithms.calc_pts_alongtheway before grid traversal, shapely intersection with every square of bounding rectangle
+    x1,y1 = pos_start
+    x2,y2 = pos_end
+    path = set()
+    line = LineString([(x1 + 0.5, y1 + 0.5), (x2 + 0.5, y2 + 0.5)])
+
+    for x in range(min(x1, x2), max(x1, x2) + 1):
+        for y in range(min(y1, y2), max(y1, y2) + 1):
+            intersection = line.intersection(box(x, y, x + 1, y + 1))
+            if not intersection.is_empty and intersection.length >= 0.1:
+                path.add((x, y))
+    return [pos for pos in path if pos not in (pos_start, pos_end)]
+
+def run_lines (size, queries, seed = 1):
+    rd.seed(seed)
+    pairs = [((rd.randrange(size), rd.randrange(size)), (rd.randrange(size), rd.randrange(size))) for _ in range(queries)]
+    algorithms = Algorithms(None)
+
+    t = time.perf_counter()
+    legacy_paths = [sorted(legacy_pts_alongtheway(s, e)) for s, e in pairs]
+    t_legacy = time.perf_counter() - t
+
+    t = time.perf_counter()
+    paths = [sorted(algorithms.calc_pts_alongtheway(s, e)) for s, e in pairs]
+    t_engine = time.perf_counter() - t
+
+    if legacy_paths != paths:
+        raise ValueError (f"Lines differ on board {size}x{size}")
+
+    print(f"{size:>4}x{size:<4} {queries:>6} {queries / t_legacy:>14,.0f} {queries / t_engine:>14,.0f} {t_legacy / t_engine:>8.1f}x")
+
+def run (size, queries, seed = 1):
+    manager = BenchManager(size, seed)
+    pairs = manager.free_positions(queries)
+    legacy = LegacyAStar(manager.instance_board)
+    engine = manager.instance_pathfinder
+
+    t = time.perf_counter()
+    legacy_costs = [legacy.check_move(s, e) for s, e in pairs]
+    t_legacy = time.perf_counter() - t
+
+    t = time.perf_counter()
+    engine_costs = []
+    for s, e in pairs:
+        settled, _ = engine.search(s, e)
+        engine_costs.append(settled[e][0] if e in settled else float('inf'))
+    t_engine = time.perf_counter() - t
+
+    if legacy_costs != engine_costs:
+        raise ValueError (f"Costs differ on board {size}x{size}")
+
+    legacy_rate = legacy.expanded / t_legacy
+    engine_rate = engine.expanded / t_engine
+    print(f"{size:>4}x{size:<4} {queries:>6} {legacy_rate:>14,.0f} {engine_rate:>14,.0f} {t_legacy / t_engine:>8.1f}x")
+
+if __name__ == "__main__":
+    print(f"{'board':<9} {'queries':>6} {'legacy nodes/s':>14} {'heap nodes/s':>14} {'speedup':>9}")
+    for size, queries in [(35, 200), (70, 100), (140, 30)]:
+        run(size, queries)
+
+    if LineString is None:
+        print("\nshapely not installed, line of sight comparison skipped")
+    else:
+        print(f"\n{'board':<9} {'lines':>6} {'shapely lines/s':>14} {'grid lines/s':>14} {'speedup':>9}")
+        for size, queries in [(35, 500), (70, 200), (140, 50)]:
+            run_lines(size, queries)
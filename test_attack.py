@@ -0,0 +1,24 @@
+from DnD import BattleContext, Data
+
+# attacks of characters with different equipment, run: python -m pytest test_attack.py
+
+def make_context():
+    context = BattleContext(headless = True)
+    context.load_saved(["Orc", "Aragorn"])
+    return context
+
+def test_shield_bearer_can_attack():
+    context = make_context()
+    aragorn = context.characters["Aragorn"]
+    aragorn.instance_equipment.equip("offhand", Data().shields["shield"])
+
+    conditions = context.instance_conditions
+    assert not conditions.can_nick(aragorn)
+
+    event_manager = context.instance_event_manager
+    dealt = 0
+    for seed in range(5):
+        winner, rounds = event_manager.start_headless_combat(["Aragorn"], ["Orc"], seed)
+        assert winner in (1, 2)
+        dealt += event_manager.damage_dealt.get("Aragorn", 0)
+    assert dealt > 0
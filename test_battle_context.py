@@ -0,0 +1,39 @@
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from DnD import BattleContext
+
+# independent battles in threads, run: python -m pytest test_battle_context.py
+
+SEEDS = range(8)
+
+def run_battles(seeds):
+    context = BattleContext(headless = True)
+    context.load_saved(["Orc", "Aragorn"])
+    event_manager = context.instance_event_manager
+
+    results = []
+    for seed in seeds:
+        winner, rounds = event_manager.start_headless_combat(["Orc"], ["Aragorn"], seed)
+        results.append((winner, rounds, {name: c.instance_hp.current_hp for name, c in context.characters.items()}))
+    return results
+
+def test_threads_match_sequential_run(capsys):
+    sequential = run_battles(SEEDS)
+
+    stdout = sys.stdout
+    with ThreadPoolExecutor(max_workers = 4) as pool:
+        futures = [pool.submit(run_battles, SEEDS) for _ in range(4)]
+        print("main thread output")
+        threaded = [future.result() for future in futures]
+
+    assert sys.stdout is stdout
+    assert capsys.readouterr().out == "main thread output\n" # headless battles print nothing, main thread is not silenced
+    assert all(results == sequential for results in threaded)
+
+def test_profiling_per_context():
+    profiled, other = BattleContext(headless = True), BattleContext(headless = True)
+    profiled.instance_AI.profile(True)
+
+    assert profiled.profiling
+    assert not other.profiling
@@ -0,0 +1,46 @@
+import pytest
+
+from DnD import Dice, DiceExpression
+
+# dice expressions and rolls, run: python -m pytest test_dice.py
+
+def test_parse_plain_and_modifiers():
+    e = DiceExpression("2d6")
+    assert (e.number, e.sides, e.modifier, e.count) == (2, 6, 0, 2)
+
+    assert DiceExpression("1d8+3").modifier == 3
+    assert DiceExpression("1d8 - 2").modifier == -2
+    assert DiceExpression("d20").number == 1
+
+def test_parse_flags():
+    e = DiceExpression("2d6 GWF crit")
+    assert e.gwf and e.crit and not e.adv and not e.dis
+    assert e.count == 4 # crit doubles dice
+
+    assert DiceExpression("1d20 ADV").adv
+    assert DiceExpression("1d20 dis").dis
+
+@pytest.mark.parametrize("text", ["", "abc", "2x6", "2d", "2d6 lucky"])
+def test_parse_bad_input(text):
+    with pytest.raises(ValueError):
+        DiceExpression(text)
+
+def test_evaluate_ranges():
+    dice = Dice(1)
+    crit = [dice.evaluate("1d6+2 crit") for _ in range(2000)]
+    assert min(crit) == 4 and max(crit) == 14
+
+    gwf = [dice.evaluate("2d6 GWF") for _ in range(2000)]
+    assert min(gwf) == 6 and max(gwf) == 12 # 1 and 2 count as 3
+
+def test_advantage_and_disadvantage():
+    dice = Dice(1)
+    n = 5000
+    adv = sum(dice.evaluate("1d20 adv") for _ in range(n)) / n
+    dis = sum(dice.evaluate("1d20 dis") for _ in range(n)) / n
+    assert adv == pytest.approx(13.825, abs = 0.3)
+    assert dis == pytest.approx(7.175, abs = 0.3)
+
+def test_same_seed_same_rolls():
+    first, second = Dice(7), Dice(7)
+    assert [first.evaluate("3d8 crit") for _ in range(100)] == [second.evaluate("3d8 crit") for _ in range(100)]
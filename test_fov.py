@@ -0,0 +1,80 @@
+from DnD import BattleContext, Board, Character
+
+# field of view (shadowcasting) and ranged targeting, run: python -m pytest test_fov.py
+
+def make_context(size = 9):
+    context = BattleContext(headless = True)
+    context.load_saved(["Orc", "Aragorn"])
+    board = context.instance_board
+    board.size = size
+    board.board_signs = [" . ", " | ", " /\\"]
+    board.create_blank_board()
+    return context
+
+def test_forest_is_half_obstruction():
+    context = make_context()
+    board, fov = context.instance_board, context.instance_fov
+    board.terrain[4, 2] = Board.FOREST
+    board.terrain[4, 4] = Board.FOREST
+    board.version += 1
+
+    sight = fov.field((0, 4))
+    assert sight[4, 2] == 1.0 # forest itself is seen
+    assert sight[4, 3] == 0.5 # behind one forest
+    assert sight[4, 5] == 0.0 # behind two forests
+
+def test_character_blocks_sight():
+    context = make_context()
+    orc = context.characters["Orc"]
+    context.instance_board.update_player_position(orc, (2, 4))
+
+    sight = context.instance_fov.field((0, 4))
+    assert sight[4, 2] == 1.0
+    assert sight[4, 3] == 0.0
+
+def test_cache_follows_board_version():
+    context = make_context()
+    fov = context.instance_fov
+    before = fov.field((0, 4))
+    assert fov.field((0, 4)) is before
+
+    context.instance_board.update_player_position(context.characters["Orc"], (2, 4)) # bumps board version
+    after = fov.field((0, 4))
+    assert after is not before
+    assert before[4, 3] == 1.0 and after[4, 3] == 0.0
+
+def test_team_view_and_sees():
+    context = make_context()
+    orc, aragorn = context.characters["Orc"], context.characters["Aragorn"]
+    board, fov = context.instance_board, context.instance_fov
+    board.terrain[4, 2] = Board.FOREST
+    board.terrain[4, 3] = Board.FOREST
+    board.update_player_position(orc, (0, 4))
+    board.update_player_position(aragorn, (5, 4))
+
+    assert not fov.sees(orc, aragorn)
+    view = fov.team_view([orc, aragorn])
+    assert view[4, 8] == 1.0 # seen by Aragorn only
+    assert view[4, 1] == 1.0 # seen by Orc only
+
+def test_ranged_target_is_visible_enemy():
+    context = make_context()
+    orc, aragorn = context.characters["Orc"], context.characters["Aragorn"]
+    hidden = Character.load_character(context, "Aragorn.pkl")
+    hidden.name = "Boromir"
+    context.add_character(hidden)
+
+    board, em = context.instance_board, context.instance_event_manager
+    em.team_one, em.team_two = [orc], [aragorn, hidden]
+    em.update_characters_info()
+    board.terrain[1, 2] = Board.FOREST
+    board.terrain[1, 3] = Board.FOREST
+    board.update_player_position(orc, (0, 1))
+    board.update_player_position(hidden, (5, 1)) # wounded, but behind two forests
+    board.update_player_position(aragorn, (0, 7))
+    hidden.instance_hp.current_hp = 1
+
+    assert context.instance_conditions.pick_target_profile(orc, "melee")
+    assert context.instance_AI.target is hidden
+    assert context.instance_conditions.pick_target_ranged(orc)
+    assert context.instance_AI.target is aragorn
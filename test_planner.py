@@ -0,0 +1,73 @@
+import copy
+
+from DnD import BattleContext, Data
+
+# MCTS planner and actions it plans with, run: python -m pytest test_planner.py
+
+def make_context(names = ("Orc", "Aragorn")):
+    context = BattleContext(headless = True)
+    context.load_saved(list(names))
+    return context
+
+def place(context, team_one, team_two, positions):
+    # small battle without initiative / random positions
+    board = context.instance_board
+    board.final_board()
+    em = context.instance_event_manager
+    em.team_one, em.team_two = team_one, team_two
+    em.teams_control(True, True)
+    em.update_characters_info()
+    em.reset_game()
+    em.damage_dealt = {}
+    for c, position in zip(team_one + team_two, positions):
+        c.position = set()
+        board.update_player_position(c, position)
+
+def test_second_wind_is_one_candidate():
+    context = make_context()
+    orc, aragorn = context.characters["Orc"], context.characters["Aragorn"]
+    extra = copy.deepcopy(aragorn)
+    extra.name = "Boromir"
+    context.add_character(extra)
+    place(context, [orc], [aragorn, extra], [(5, 5), (10, 10), (12, 12)])
+    context.instance_action.reset_turn(orc)
+    orc.c_bonus_actions = 1
+
+    kinds = [kind for kind, _ in context.instance_planner.candidates(orc)]
+    assert kinds.count("second wind") <= 1
+    assert kinds.count("attack") == 2
+
+def test_cleave_hits_second_target():
+    context = make_context()
+    orc, aragorn = context.characters["Orc"], context.characters["Aragorn"]
+    extra = copy.deepcopy(aragorn)
+    extra.name = "Boromir"
+    context.add_character(extra)
+    orc.instance_equipment.equip("first_weapon", Data().weapons["Greataxe"])
+
+    for seed in range(10):
+        place(context, [orc], [aragorn, extra], [(5, 5), (6, 5), (6, 6)])
+        context.rng.seed(seed)
+        orc.instance_features.c_no_cleave = 1
+        context.instance_action.cleave(orc, aragorn) # second attack roll used to fail without weapon number
+
+def test_seeded_mcts_battle_is_reproducible():
+    results = []
+    for _ in range(2):
+        context = make_context()
+        context.characters["Orc"].behaviour = "mcts"
+        result = context.instance_event_manager.start_headless_combat(["Orc"], ["Aragorn"], 3)
+        results.append((result, {name: c.instance_hp.current_hp for name, c in context.characters.items()}, context.instance_planner.last))
+    assert results[0] == results[1]
+
+def test_target_set_before_first_turn_is_kept():
+    context = make_context()
+    orc, aragorn = context.characters["Orc"], context.characters["Aragorn"]
+    AI = context.instance_AI
+
+    AI.target = aragorn # no blackboard yet
+    assert AI.target is aragorn
+
+    bb = AI.new_blackboard(orc)
+    assert bb.target is aragorn
+    assert AI.pending_target is None